@@ -0,0 +1,137 @@
+"""Scaling benchmarks of the helpers in ``spopt.region.base``.
+
+The classes follow the ``asv`` conventions, ``benchmarks/run.py`` runs them
+without ``asv``.
+
+"""
+
+import numpy
+
+from spopt.region.base import (
+    _centroid,
+    _closest,
+    coarsen,
+    dissimilarity_engine,
+    label_components,
+    ok_moves,
+    removable_areas,
+    w_to_csr,
+    w_to_g,
+)
+
+from .common import (
+    GRAPHS,
+    REGION_SIZE,
+    SEED,
+    SIZES,
+    attributes,
+    voronoi_labels,
+    weights,
+)
+
+K = 20
+
+
+class TimeGraph:
+    """Adjacency conversions, components and coarsening of a whole graph."""
+
+    params = [SIZES, GRAPHS]
+    param_names = ["n", "graph"]
+
+    def setup(self, n, graph):
+        self.w = weights(graph, n)
+        self.adjacency = w_to_csr(self.w)
+        self.attr = attributes(self.w.n)
+        self.labels = voronoi_labels(graph, n, K)
+
+    def time_w_to_csr(self, n, graph):
+        w_to_csr(self.w)
+
+    def time_w_to_g(self, n, graph):
+        w_to_g(self.w)
+
+    def time_label_components(self, n, graph):
+        label_components(self.adjacency, self.labels)
+
+    def time_coarsen(self, n, graph):
+        coarsen(
+            self.adjacency,
+            self.attr,
+            numpy.ones(self.w.n),
+            REGION_SIZE / 2,
+            rng=numpy.random.default_rng(SEED),
+        )
+
+
+class TimeRegion:
+    """Region level helpers on the largest of ``K`` Voronoi regions."""
+
+    params = [SIZES, GRAPHS]
+    param_names = ["n", "graph"]
+
+    def setup(self, n, graph):
+        w = weights(graph, n)
+        self.adjacency = w_to_csr(w)
+        labels = voronoi_labels(graph, n, K)
+        self.members = numpy.flatnonzero(labels == numpy.bincount(labels).argmax())
+        self.engine = dissimilarity_engine(attributes(w.n), "ondemand")
+
+    def time_removable_areas(self, n, graph):
+        removable_areas(self.adjacency, self.members)
+
+    def time_within_sum(self, n, graph):
+        self.engine.within_sum(self.members)
+
+
+class TimeDissimilarity:
+    """Building the ``'auto'`` dissimilarity engine."""
+
+    params = [SIZES]
+    param_names = ["n"]
+    timeout = 600
+
+    def setup(self, n):
+        self.attr = attributes(n)
+
+    def time_dissimilarity_engine(self, n):
+        dissimilarity_engine(self.attr)
+
+    def peakmem_dissimilarity_engine(self, n):
+        dissimilarity_engine(self.attr)
+
+
+class TimeReassignment:
+    """One reassignment round of region k-means over ``K`` regions."""
+
+    params = [SIZES, GRAPHS]
+    param_names = ["n", "graph"]
+    timeout = 600
+
+    def setup(self, n, graph):
+        self.w = weights(graph, n)
+        self.adjacency = w_to_csr(self.w)
+        self.data = attributes(self.w.n)
+        self.labels = voronoi_labels(graph, n, K)
+        self.areas = numpy.arange(self.w.n)
+        self.regions = [self.areas[self.labels == r].tolist() for r in range(K)]
+        self.centroids = _centroid(self.regions, self.data)
+        self.closest = _closest(self.data, self.centroids)
+
+    def time_centroid(self, n, graph):
+        _centroid(self.regions, self.data)
+
+    def time_closest(self, n, graph):
+        _closest(self.data, self.centroids)
+
+    def time_ok_moves(self, n, graph):
+        candidates = self.areas[self.closest != self.labels]
+        ok_moves(
+            candidates,
+            self.regions,
+            self.labels,
+            self.closest,
+            None,
+            self.w,
+            self.areas,
+            adjacency=self.adjacency,
+        )
@@ -0,0 +1,100 @@
+"""Micro-benchmark of maxp region growing as the threshold grows.
+
+The classes follow the ``asv`` conventions. The module can also be run
+directly, ``python benchmarks/bench_grow_cluster.py``, to print a table.
+
+"""
+
+import timeit
+
+import libpysal
+import numpy
+
+from spopt.region.base import w_to_csr
+from spopt.region.maxp import growClusterForPoly
+
+SIDE = 150
+THRESHOLDS = [10, 100, 1000, 5000]
+
+
+def grow_list_frontier(
+    labels, threshold_array, P, NeighborPolys, C, weight, spatialThre
+):
+    """Region growing with membership tests on the frontier list, as used
+    before the queued mask was introduced. Kept for comparison.
+
+    """
+
+    labels[P] = C
+    labeledID = [P]
+    spatialAttrTotal = threshold_array[P]
+    i = 0
+    while i < len(NeighborPolys):
+        if spatialAttrTotal >= spatialThre:
+            break
+        Pn = NeighborPolys[i]
+        if labels[Pn] == 0:
+            labels[Pn] = C
+            labeledID.append(Pn)
+            spatialAttrTotal += threshold_array[Pn]
+            if spatialAttrTotal < spatialThre:
+                for pnn in weight.neighbors[Pn]:
+                    if not pnn in NeighborPolys:
+                        NeighborPolys.append(pnn)
+        i += 1
+    return labeledID, spatialAttrTotal
+
+
+class TimeGrowClusterForPoly:
+    """Grow one cluster from the center of a ``SIDE`` x ``SIDE`` queen
+    lattice with unit threshold values, so the threshold is the cluster size.
+
+    """
+
+    params = THRESHOLDS
+    param_names = ["threshold"]
+
+    def setup(self, threshold):
+        self.w = libpysal.weights.lat2W(SIDE, SIDE, rook=False)
+        adjacency = w_to_csr(self.w)
+        self.adjacency = (adjacency.indptr.tolist(), adjacency.indices.tolist())
+        self.threshold_array = [1] * self.w.n
+        self.seed = self.w.n // 2 + SIDE // 2
+        self.queued = bytearray(self.w.n)
+
+    def time_grow(self, threshold):
+        labels = [0] * self.w.n
+        growClusterForPoly(
+            labels,
+            self.threshold_array,
+            self.seed,
+            1,
+            self.adjacency,
+            threshold,
+            queued=self.queued,
+        )
+
+    def time_grow_list_frontier(self, threshold):
+        labels = [0] * self.w.n
+        grow_list_frontier(
+            labels,
+            self.threshold_array,
+            self.seed,
+            list(self.w.neighbors[self.seed]),
+            1,
+            self.w,
+            threshold,
+        )
+
+
+if __name__ == "__main__":
+    bench = TimeGrowClusterForPoly()
+    print("%10s %14s %14s" % ("threshold", "mask (ms)", "list (ms)"))
+    for threshold in THRESHOLDS:
+        bench.setup(threshold)
+        times = []
+        for method in [bench.time_grow, bench.time_grow_list_frontier]:
+            timer = timeit.Timer(lambda: method(threshold))
+            number, _ = timer.autorange()
+            times.append(min(timer.repeat(3, number)) / number * 1000)
+        print("%10d %14.3f %14.3f" % (threshold, *times))
@@ -0,0 +1,118 @@
+"""Scaling benchmarks of ``MaxPHeuristic``.
+
+The classes follow the ``asv`` conventions, ``benchmarks/run.py`` runs them
+without ``asv``. Problems up to ``10000`` areas are solved directly, larger
+ones with the multilevel mode only.
+
+"""
+
+import functools
+
+import pandas
+
+from spopt import MaxPHeuristic
+from spopt.region.maxp import (
+    MULTILEVEL_MIN_N,
+    Partition,
+    calculateWithinRegionDistance,
+)
+
+from .common import GRAPHS, REGION_SIZE, SEED, SIZES, attributes, weights
+
+MODES = ["standard", "multilevel"]
+# largest problem solved without the multilevel mode
+STANDARD_MAX_N = 10000
+
+
+def _check(n, mode):
+    if mode == "standard" and n > STANDARD_MAX_N:
+        raise NotImplementedError("Use the multilevel mode for this size.")
+    if mode == "multilevel" and n <= MULTILEVEL_MIN_N:
+        raise NotImplementedError("Too small to coarsen.")
+
+
+def _model(n, graph, mode, profile_memory=False):
+    w = weights(graph, n)
+    data = pandas.DataFrame(attributes(w.n))
+    data.columns = ["x%d" % i for i in data.columns]
+    attrs_name = list(data.columns)
+    data["count"] = 1
+    model = MaxPHeuristic(
+        data,
+        w,
+        attrs_name,
+        "count",
+        REGION_SIZE,
+        2,
+        max_iterations_construction=10,
+        max_iterations_sa=2,
+        seed=SEED,
+        multilevel=mode == "multilevel",
+        profile_memory=profile_memory,
+    )
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def _solved(n, graph, mode):
+    model = _model(n, graph, mode, profile_memory=True)
+    model.solve()
+    return model
+
+
+class TimeMaxPHeuristic:
+    """Wall-clock time and peak resident memory of ``solve``."""
+
+    params = [SIZES, GRAPHS, MODES]
+    param_names = ["n", "graph", "mode"]
+    timeout = 3600
+
+    def setup(self, n, graph, mode):
+        _check(n, mode)
+        self.model = _model(n, graph, mode)
+
+    def time_solve(self, n, graph, mode):
+        self.model.solve()
+
+    def peakmem_solve(self, n, graph, mode):
+        self.model.solve()
+
+
+class TrackMaxPHeuristic:
+    """Solution quality and traced memory of ``solve``."""
+
+    params = [SIZES, GRAPHS, MODES]
+    param_names = ["n", "graph", "mode"]
+    timeout = 3600
+
+    def setup(self, n, graph, mode):
+        _check(n, mode)
+        self.model = _solved(n, graph, mode)
+
+    def track_p(self, n, graph, mode):
+        return self.model.p
+
+    track_p.unit = "regions"
+
+    def track_objective(self, n, graph, mode):
+        model = self.model
+        partition = Partition.from_labels(model.labels_, model._threshold_array)
+        return calculateWithinRegionDistance(partition, model._engine())
+
+    track_objective.unit = "dissimilarity"
+
+    def track_traced_peak(self, n, graph, mode):
+        return self.model.memory_["solve"]["peak"]
+
+    track_traced_peak.unit = "bytes"
+
+    def track_estimated_peak(self, n, graph, mode):
+        estimate = MaxPHeuristic.estimate_memory(
+            self.model.w.n,
+            len(self.model.attrs_name),
+            max_iterations_construction=self.model.max_iterations_construction,
+            n_neighbors=self.model.w.mean_neighbors,
+        )
+        return estimate["peak"]
+
+    track_estimated_peak.unit = "bytes"
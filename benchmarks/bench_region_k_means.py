@@ -0,0 +1,80 @@
+"""Scaling benchmarks of ``RegionKMeansHeuristic``.
+
+The classes follow the ``asv`` conventions, ``benchmarks/run.py`` runs them
+without ``asv``.
+
+"""
+
+import functools
+
+import numpy
+
+from spopt import RegionKMeansHeuristic
+
+from .common import GRAPHS, SIZES, attributes, weights
+
+K = 20
+
+
+def _model(n, graph, profile_memory=False):
+    w = weights(graph, n)
+    model = RegionKMeansHeuristic(
+        attributes(w.n), K, w, profile_memory=profile_memory
+    )
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def _solved(n, graph):
+    # the seeds of region_k_means are drawn from the global random state
+    numpy.random.seed(0)
+    model = _model(n, graph, profile_memory=True)
+    model.solve()
+    return model
+
+
+class TimeRegionKMeansHeuristic:
+    """Wall-clock time and peak resident memory of ``solve``."""
+
+    params = [SIZES, GRAPHS]
+    param_names = ["n", "graph"]
+    timeout = 3600
+
+    def setup(self, n, graph):
+        self.model = _model(n, graph)
+
+    def time_solve(self, n, graph):
+        numpy.random.seed(0)
+        self.model.solve()
+
+    def peakmem_solve(self, n, graph):
+        numpy.random.seed(0)
+        self.model.solve()
+
+
+class TrackRegionKMeansHeuristic:
+    """Solution quality, iterations and traced memory of ``solve``."""
+
+    params = [SIZES, GRAPHS]
+    param_names = ["n", "graph"]
+    timeout = 3600
+
+    def setup(self, n, graph):
+        self.model = _solved(n, graph)
+
+    def track_sse(self, n, graph):
+        model = self.model
+        residuals = model.data - model.centroids_[model.labels_]
+        return float((residuals ** 2).sum())
+
+    track_sse.unit = "sum of squares"
+
+    def track_iters(self, n, graph):
+        return self.model.iters_
+
+    track_iters.unit = "iterations"
+
+    def track_traced_peak(self, n, graph):
+        return self.model.memory_["solve"]["peak"]
+
+    track_traced_peak.unit = "bytes"
@@ -0,0 +1,73 @@
+"""Synthetic problems shared by the benchmarks.
+
+Every problem is generated from a fixed seed, so timings and solution
+quality are comparable across runs and commits.
+
+"""
+
+import functools
+
+import libpysal
+import numpy
+from scipy.spatial import Delaunay, cKDTree
+
+SEED = 12345
+SIZES = [1000, 10000, 100000]
+GRAPHS = ["lattice", "planar"]
+N_FEATURES = 4
+# unit threshold values, so regions hold about this many areas
+REGION_SIZE = 20
+
+
+@functools.lru_cache(maxsize=None)
+def points(graph, n):
+    """Coordinates of the areas of ``weights(graph, n)``."""
+
+    if graph == "lattice":
+        side = int(numpy.ceil(numpy.sqrt(n)))
+        rows, cols = numpy.divmod(numpy.arange(side * side), side)
+        return numpy.column_stack([cols, rows]) / side
+    if graph == "planar":
+        return numpy.random.default_rng(SEED).random((n, 2))
+    raise ValueError("Unknown graph '%s'. Choose one of %s." % (graph, GRAPHS))
+
+
+@functools.lru_cache(maxsize=None)
+def weights(graph, n):
+    """Contiguity weights of ``n`` areas, at least ``n`` for a lattice.
+
+    ``'lattice'`` is the rook lattice of side ``ceil(sqrt(n))`` and
+    ``'planar'`` the Delaunay triangulation of ``n`` uniform random points,
+    a random planar graph with about six neighbors per area.
+
+    """
+
+    if graph == "lattice":
+        side = int(numpy.ceil(numpy.sqrt(n)))
+        return libpysal.weights.lat2W(side, side)
+    indptr, indices = Delaunay(points(graph, n)).vertex_neighbor_vertices
+    neighbors = {i: indices[indptr[i] : indptr[i + 1]].tolist() for i in range(n)}
+    return libpysal.weights.W(neighbors)
+
+
+@functools.lru_cache(maxsize=None)
+def voronoi_labels(graph, n, k):
+    """Labels ``0, ..., k - 1`` of the areas closest to each of ``k`` random
+    sites, compact and almost always contiguous regions.
+
+    """
+
+    xy = points(graph, n)
+    sites = numpy.random.default_rng(SEED).random((k, 2))
+    labels = cKDTree(sites).query(xy)[1]
+    return labels
+
+
+@functools.lru_cache(maxsize=None)
+def attributes(n, n_features=N_FEATURES):
+    """Attributes of ``n`` areas, a smooth trend plus noise."""
+
+    rng = numpy.random.default_rng(SEED)
+    trend = numpy.linspace(0, 1, n)[:, None] * rng.random(n_features)
+    attr = trend + 0.1 * rng.standard_normal((n, n_features))
+    return attr
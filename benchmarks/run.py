@@ -0,0 +1,173 @@
+"""Run the benchmarks without ``asv``.
+
+Every ``time_``, ``peakmem_`` and ``track_`` method of the benchmark classes
+in ``benchmarks/bench_*.py`` is run for each combination of its parameters
+and reported as a table, optionally saved as JSON to compare runs::
+
+    python benchmarks/run.py --sizes 1000 10000 --output baseline.json
+    python benchmarks/run.py --bench maxp --graphs planar
+
+Unlike ``asv``, which reports the resident set size, ``peakmem_`` here is the
+peak traced by ``tracemalloc`` during the call. A benchmark whose ``setup``
+raises ``NotImplementedError`` is skipped, as in ``asv``.
+
+"""
+
+import argparse
+import glob
+import importlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIXES = ("time_", "peakmem_", "track_")
+
+
+def _classes(pattern):
+    for path in sorted(glob.glob(os.path.join(ROOT, "benchmarks", "bench_*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if pattern and not any(p in name for p in pattern):
+            continue
+        module = importlib.import_module("benchmarks." + name)
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and _methods(cls):
+                yield name, cls
+
+
+def _methods(cls):
+    return [m for m in sorted(vars(cls)) if m.startswith(PREFIXES)]
+
+
+def _combinations(cls, filters):
+    params = getattr(cls, "params", [])
+    names = getattr(cls, "param_names", [])
+    if params and not isinstance(params[0], list):
+        params = [params]
+    for values in itertools.product(*params):
+        keep = all(
+            filters.get(name) is None or value in filters[name]
+            for name, value in zip(names, values)
+        )
+        if keep:
+            yield dict(zip(names, values)), values
+
+
+def _measure(bench, method, values, repeat):
+    func = getattr(bench, method)
+    if method.startswith("track_"):
+        return func(*values), getattr(func, "unit", "")
+    if method.startswith("peakmem_"):
+        # importable once ``main`` put the repository on the path
+        from spopt.region.base import _reset_peak
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        _reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(*values)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        if started:
+            tracemalloc.stop()
+        return peak, "bytes"
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*values)
+        best = min(best, time.perf_counter() - start)
+    return best, "seconds"
+
+
+def run(pattern=None, sizes=None, graphs=None, repeat=1):
+    """Run the matching benchmarks and return one record per measurement.
+
+    Parameters
+    ----------
+
+    pattern : list
+        Only modules whose name contains one of these strings, e.g.
+        ``['maxp']``. Default is ``None``, all modules.
+
+    sizes : list
+        Only these values of the ``n`` parameter. Default is ``None``, all.
+
+    graphs : list
+        Only these values of the ``graph`` parameter. Default is ``None``,
+        all.
+
+    repeat : int
+        Timings keep the best of this many calls. Default is ``1``.
+
+    Returns
+    -------
+
+    records : list
+        Dicts with the ``'benchmark'`` name, its ``'params'``, the measured
+        ``'value'`` or ``None`` when skipped, and its ``'unit'``.
+
+    """
+
+    filters = {"n": sizes, "graph": graphs}
+    records = []
+    for name, cls in _classes(pattern):
+        for params, values in _combinations(cls, filters):
+            for method in _methods(cls):
+                bench = cls()
+                record = {
+                    "benchmark": "%s.%s.%s" % (name, cls.__name__, method),
+                    "params": params,
+                    "value": None,
+                    "unit": "",
+                }
+                try:
+                    if hasattr(bench, "setup"):
+                        bench.setup(*values)
+                except NotImplementedError:
+                    record["unit"] = "skipped"
+                else:
+                    record["value"], record["unit"] = _measure(
+                        bench, method, values, repeat
+                    )
+                    if hasattr(bench, "teardown"):
+                        bench.teardown(*values)
+                records.append(record)
+                print(_format(record), flush=True)
+    return records
+
+
+def _format(record):
+    params = " ".join("%s=%s" % item for item in record["params"].items())
+    value = record["value"]
+    if value is None:
+        text = "-"
+    elif isinstance(value, float):
+        text = "%.6g" % value
+    else:
+        text = str(value)
+    return "%-68s %-36s %14s %s" % (record["benchmark"], params, text, record["unit"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bench", nargs="*", help="module name substrings")
+    parser.add_argument(
+        "--sizes", nargs="*", type=int, default=[1000], help="values of n"
+    )
+    parser.add_argument("--graphs", nargs="*", help="'lattice' and/or 'planar'")
+    parser.add_argument("--repeat", type=int, default=1, help="timing repeats")
+    parser.add_argument("--output", help="JSON file for the records")
+    args = parser.parse_args(argv)
+    records = run(args.bench, args.sizes, args.graphs, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=1)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    main()
@@ -25,6 +25,7 @@ def setup_package():
     _groups_files = {
         "base": "requirements.txt",  # basic requirements
         "docs": "requirements_docs.txt",  # requirements for building docs
+        "numba": "requirements_numba.txt",  # compiled simulated annealing
     }
     reqs = _get_requirements_from_files(_groups_files)
     install_reqs = reqs.pop("base")
@@ -0,0 +1,588 @@
+"""Compiled simulated annealing kernel of ``maxp``.
+
+``perform_sa`` runs the loop of ``spopt.region.maxp.performSA`` on the flat
+arrays of a ``Partition`` with Numba. Every step mirrors the pure Python
+implementation, including the lazily cached area to region dissimilarity
+sums, NumPy's pairwise summation order and the draws from the
+``numpy.random.Generator``, so both backends return the same partition for
+the same seed. Numba is optional, ``resolve`` falls back to the pure Python
+loop when it is missing. The kernel sends no per-move callback events.
+
+"""
+
+import math
+import time
+import warnings
+
+import numpy
+
+from .base import CondensedDissimilarity, DenseDissimilarity
+
+try:
+    import numba
+
+    _jit = numba.njit(cache=True)
+except ImportError:
+    numba = None
+
+    def _jit(func):
+        return func
+
+SA_BACKENDS = ["python", "numba"]
+# iterations between two deadline checks of the kernel
+DEADLINE_EVERY = 256
+# size of the chunks NumPy reduces one after another, and of the blocks
+# below which its pairwise summation adds sequentially
+_REDUCE_BUFFER = 8192
+_PAIRWISE_BLOCK = 128
+
+
+def check_backend(backend):
+    """Raise a ``ValueError`` unless ``backend`` is in ``SA_BACKENDS``."""
+
+    if backend not in SA_BACKENDS:
+        raise ValueError(
+            "Unknown sa_backend '%s'. Choose one of %s."
+            % (backend, ", ".join("'%s'" % b for b in SA_BACKENDS))
+        )
+
+
+def resolve(backend, distance_matrix):
+    """The backend ``performSA`` can use for ``backend``.
+
+    Parameters
+    ----------
+
+    backend : str
+        ``'python'`` or ``'numba'``.
+
+    distance_matrix : spopt.region.base.Dissimilarity
+        The dissimilarity engine of the annealing.
+
+    Returns
+    -------
+
+    backend : str
+        ``backend``, or ``'python'`` with a warning when Numba is missing or
+        the engine computes the dissimilarities on demand.
+
+    """
+
+    check_backend(backend)
+    if backend == "python":
+        return backend
+    reason = None
+    if numba is None:
+        reason = "Numba is not installed"
+    elif not isinstance(
+        distance_matrix, (DenseDissimilarity, CondensedDissimilarity)
+    ):
+        reason = "the dissimilarities are computed on demand"
+    if reason is not None:
+        warnings.warn(
+            "sa_backend='numba' is unavailable because %s, using the pure "
+            "Python simulated annealing instead." % reason
+        )
+        return "python"
+    return backend
+
+
+def perform_sa(
+    partition,
+    distance_matrix,
+    threshold,
+    alpha,
+    tabuLength,
+    max_no_move,
+    objective,
+    adjacency,
+    counters,
+    rng,
+    deadline,
+    regions,
+):
+    """Anneal ``partition`` in place with the compiled kernel.
+
+    The arguments are those of ``performSA``, already resolved. Returns the
+    final objective.
+
+    """
+
+    capacity = partition.size.size
+    mask = numpy.ones(capacity, dtype=numpy.bool_)
+    if regions is not None:
+        mask[:] = False
+        selected = [r for r in regions if 0 <= r < capacity]
+        mask[selected] = True
+    if isinstance(distance_matrix, DenseDissimilarity):
+        matrix = numpy.ascontiguousarray(distance_matrix.matrix, dtype=numpy.float64)
+        vector = numpy.empty(0)
+    else:
+        matrix = numpy.empty((0, 0))
+        vector = numpy.ascontiguousarray(distance_matrix.vector, dtype=numpy.float64)
+    stats = numpy.zeros(6, dtype=numpy.int64)
+    objective = _anneal(
+        partition.labels,
+        partition.next,
+        partition.prev,
+        partition.head,
+        partition.tail,
+        partition.size,
+        partition.spatial,
+        # a writable copy, read-only arrays would compile another signature
+        numpy.array(partition.threshold_array, dtype=numpy.float64),
+        float(threshold),
+        adjacency.indptr.astype(numpy.int64),
+        adjacency.indices.astype(numpy.int64),
+        matrix,
+        vector,
+        float(alpha),
+        int(tabuLength),
+        int(max_no_move),
+        float(objective),
+        rng,
+        numpy.inf if deadline is None else float(deadline),
+        mask,
+        stats,
+    )
+    partition._members = {}
+    for key, value in zip(
+        [
+            "movable_area_cache_hits",
+            "movable_area_cache_misses",
+            "pickMoveArea_calls",
+            "checkMove_calls",
+            "sa_moves_accepted",
+            "sa_moves_rejected",
+        ],
+        stats.tolist(),
+    ):
+        if value:
+            counters[key] += value
+    return objective
+
+
+@_jit
+def _block_sum(a, lo, n):
+    # numpy/core/src/umath/loops_utils.h.src, pairwise_sum below the blocksize
+    if n < 8:
+        res = -0.0
+        for i in range(lo, lo + n):
+            res += a[i]
+        return res
+    r0 = a[lo]
+    r1 = a[lo + 1]
+    r2 = a[lo + 2]
+    r3 = a[lo + 3]
+    r4 = a[lo + 4]
+    r5 = a[lo + 5]
+    r6 = a[lo + 6]
+    r7 = a[lo + 7]
+    i = 8
+    while i < n - (n % 8):
+        r0 += a[lo + i]
+        r1 += a[lo + i + 1]
+        r2 += a[lo + i + 2]
+        r3 += a[lo + i + 3]
+        r4 += a[lo + i + 4]
+        r5 += a[lo + i + 5]
+        r6 += a[lo + i + 6]
+        r7 += a[lo + i + 7]
+        i += 8
+    res = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < n:
+        res += a[lo + i]
+        i += 1
+    return res
+
+
+@_jit
+def _pairwise_sum(a, lo, n):
+    # pairwise_sum splits larger ranges in halves of a multiple of 8, the
+    # recursion is unrolled onto a stack since Numba cannot cache it
+    if n <= _PAIRWISE_BLOCK:
+        return _block_sum(a, lo, n)
+    los = numpy.empty(64, dtype=numpy.int64)
+    ns = numpy.empty(64, dtype=numpy.int64)
+    stages = numpy.empty(64, dtype=numpy.int64)
+    lefts = numpy.empty(64)
+    los[0] = lo
+    ns[0] = n
+    stages[0] = 0
+    depth = 0
+    res = 0.0
+    while depth >= 0:
+        m = ns[depth]
+        half = m // 2
+        half -= half % 8
+        if m <= _PAIRWISE_BLOCK:
+            res = _block_sum(a, los[depth], m)
+            depth -= 1
+        elif stages[depth] == 0:
+            stages[depth] = 1
+            los[depth + 1] = los[depth]
+            ns[depth + 1] = half
+            stages[depth + 1] = 0
+            depth += 1
+        elif stages[depth] == 1:
+            stages[depth] = 2
+            lefts[depth] = res
+            los[depth + 1] = los[depth] + half
+            ns[depth + 1] = m - half
+            stages[depth + 1] = 0
+            depth += 1
+        else:
+            res = lefts[depth] + res
+            depth -= 1
+    return res
+
+
+@_jit
+def _array_sum(a, n):
+    # ndarray.sum of a contiguous float64 array
+    res = _pairwise_sum(a, 0, min(n, _REDUCE_BUFFER))
+    lo = _REDUCE_BUFFER
+    while lo < n:
+        res += _pairwise_sum(a, lo, min(_REDUCE_BUFFER, n - lo))
+        lo += _REDUCE_BUFFER
+    return res
+
+
+@_jit
+def _dissimilarity(matrix, vector, n, i, j):
+    if matrix.shape[0] > 0:
+        return matrix[i, j]
+    if i == j:
+        return 0.0
+    lo = min(i, j)
+    hi = max(i, j)
+    return vector[n * lo - lo * (lo + 1) // 2 + hi - lo - 1]
+
+
+@_jit
+def _removable(members, m, indptr, indices, local, out):
+    # spopt.region.base.removable_areas on the first m members
+    for i in range(m):
+        out[i] = False
+    if m < 2:
+        return
+    for i in range(m):
+        local[members[i]] = i
+    disc = numpy.full(m, -1, dtype=numpy.int64)
+    low = numpy.zeros(m, dtype=numpy.int64)
+    parent = numpy.full(m, -1, dtype=numpy.int64)
+    component = numpy.full(m, -1, dtype=numpy.int64)
+    is_cut = numpy.zeros(m, dtype=numpy.bool_)
+    stack = numpy.empty(m, dtype=numpy.int64)
+    cursor = numpy.empty(m, dtype=numpy.int64)
+    timer = 0
+    n_components = 0
+    for root in range(m):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        component[root] = n_components
+        root_children = 0
+        top = 0
+        stack[0] = root
+        cursor[root] = indptr[members[root]]
+        while top >= 0:
+            v = stack[top]
+            end = indptr[members[v] + 1]
+            descended = False
+            while cursor[v] < end:
+                u = local[indices[cursor[v]]]
+                cursor[v] += 1
+                if u == -1:
+                    continue
+                if disc[u] == -1:
+                    parent[u] = v
+                    disc[u] = low[u] = timer
+                    timer += 1
+                    component[u] = n_components
+                    if v == root:
+                        root_children += 1
+                    top += 1
+                    stack[top] = u
+                    cursor[u] = indptr[members[u]]
+                    descended = True
+                    break
+                elif u != parent[v] and disc[u] < low[v]:
+                    low[v] = disc[u]
+            if descended:
+                continue
+            top -= 1
+            if top >= 0:
+                p = stack[top]
+                if low[v] < low[p]:
+                    low[p] = low[v]
+                if p != root and low[v] >= disc[p]:
+                    is_cut[p] = True
+        if root_children > 1:
+            is_cut[root] = True
+        n_components += 1
+    for i in range(m):
+        local[members[i]] = -1
+    if n_components == 1:
+        for i in range(m):
+            out[i] = not is_cut[i]
+    elif n_components == 2:
+        sizes = numpy.zeros(2, dtype=numpy.int64)
+        for i in range(m):
+            sizes[component[i]] += 1
+        for i in range(m):
+            out[i] = sizes[component[i]] == 1
+
+
+@_jit
+def _now():
+    with numba.objmode(t="float64"):
+        t = time.perf_counter()
+    return t
+
+
+@_jit
+def _remove(potential, n_potential, area):
+    # list.remove, first occurrence
+    i = 0
+    while potential[i] != area:
+        i += 1
+    for j in range(i, n_potential - 1):
+        potential[j] = potential[j + 1]
+    return n_potential - 1
+
+
+@_jit
+def _in_tabu(tabu, n_tabu, area, first, second):
+    for i in range(n_tabu):
+        if tabu[i, 0] == area and tabu[i, 1] == first and tabu[i, 2] == second:
+            return True
+    return False
+
+
+@_jit
+def _grown(a, size):
+    grown = numpy.empty(size, dtype=a.dtype)
+    grown[: a.size] = a
+    return grown
+
+
+@_jit
+def _anneal(
+    labels,
+    nxt,
+    prv,
+    head,
+    tail,
+    size,
+    spatial,
+    threshold_array,
+    threshold,
+    indptr,
+    indices,
+    matrix,
+    vector,
+    alpha,
+    tabuLength,
+    max_no_move,
+    objective,
+    rng,
+    deadline,
+    mask,
+    stats,
+):
+    n = labels.size
+    capacity = size.size
+    # RegionDistanceSums: one entry per requested (area, region), chained
+    # per area for lookups and per region for the updates of a move
+    entry_region = numpy.empty(4 * n, dtype=numpy.int64)
+    entry_area = numpy.empty(4 * n, dtype=numpy.int64)
+    entry_anext = numpy.empty(4 * n, dtype=numpy.int64)
+    entry_rnext = numpy.empty(4 * n, dtype=numpy.int64)
+    entry_value = numpy.empty(4 * n)
+    area_entries = numpy.full(n, -1, dtype=numpy.int64)
+    region_entries = numpy.full(capacity, -1, dtype=numpy.int64)
+    n_entries = 0
+    # movable area cache of pickMoveArea
+    valid = numpy.zeros(capacity, dtype=numpy.bool_)
+    movable = numpy.zeros(n, dtype=numpy.bool_)
+    members = numpy.empty(n, dtype=numpy.int64)
+    lost_ok = numpy.empty(n, dtype=numpy.bool_)
+    removable = numpy.empty(n, dtype=numpy.bool_)
+    local = numpy.full(n, -1, dtype=numpy.int64)
+    row = numpy.empty(n)
+    potential = numpy.empty(n, dtype=numpy.int64)
+    n_potential = 0
+    tabu = numpy.empty((max(tabuLength, 1), 3), dtype=numpy.int64)
+    n_tabu = 0
+
+    t = 1.0
+    ni_move_ct = 0
+    has_candidates = True
+    iteration = 0
+    while ni_move_ct <= max_no_move:
+        if deadline < numpy.inf and iteration % DEADLINE_EVERY == 0:
+            if _now() >= deadline:
+                break
+        iteration += 1
+        if n_potential == 0:
+            if not has_candidates:
+                break
+            has_candidates = False
+            # pickMoveArea
+            stats[2] += 1
+            for k in range(capacity):
+                if size[k] == 0 or not mask[k]:
+                    continue
+                m = 0
+                area = head[k]
+                while area != -1:
+                    members[m] = area
+                    m += 1
+                    area = nxt[area]
+                if valid[k]:
+                    stats[0] += 1
+                else:
+                    stats[1] += 1
+                    any_lost = False
+                    for i in range(m):
+                        left = spatial[k] - threshold_array[members[i]]
+                        lost_ok[i] = left > threshold
+                        any_lost = any_lost or lost_ok[i]
+                    if any_lost:
+                        _removable(members, m, indptr, indices, local, removable)
+                    for i in range(m):
+                        movable[members[i]] = any_lost and lost_ok[i] and removable[i]
+                    valid[k] = True
+                for i in range(m):
+                    if movable[members[i]]:
+                        potential[n_potential] = members[i]
+                        n_potential += 1
+
+        if n_potential == 0:
+            break
+        poa = potential[rng.integers(0, n_potential)]
+        stats[3] += 1
+
+        # checkMove, step 0 looks up the donor region
+        donor = labels[poa]
+        lost = 0.0
+        min_added = numpy.inf
+        recipient = -1
+        for step in range(indptr[poa + 1] - indptr[poa] + 1):
+            if step == 0:
+                region = donor
+            else:
+                region = labels[indices[indptr[poa] + step - 1]]
+                if region <= 0 or not mask[region] or region == donor:
+                    continue
+            e = area_entries[poa]
+            while e != -1 and entry_region[e] != region:
+                e = entry_anext[e]
+            if e == -1:
+                m = 0
+                area = head[region]
+                while area != -1:
+                    row[m] = _dissimilarity(matrix, vector, n, poa, area)
+                    m += 1
+                    area = nxt[area]
+                if n_entries == entry_value.size:
+                    entry_region = _grown(entry_region, 2 * n_entries)
+                    entry_area = _grown(entry_area, 2 * n_entries)
+                    entry_anext = _grown(entry_anext, 2 * n_entries)
+                    entry_rnext = _grown(entry_rnext, 2 * n_entries)
+                    entry_value = _grown(entry_value, 2 * n_entries)
+                e = n_entries
+                n_entries += 1
+                entry_region[e] = region
+                entry_area[e] = poa
+                entry_value[e] = _array_sum(row, m)
+                entry_anext[e] = area_entries[poa]
+                area_entries[poa] = e
+                entry_rnext[e] = region_entries[region]
+                region_entries[region] = e
+            if step == 0:
+                lost = entry_value[e]
+            elif entry_value[e] < min_added:
+                min_added = entry_value[e]
+                recipient = region
+
+        if recipient == -1:
+            n_potential = _remove(potential, n_potential, poa)
+            continue
+        has_candidates = True
+
+        diff = lost - min_added
+        if diff > 0:
+            make_move = True
+            if not _in_tabu(tabu, n_tabu, poa, recipient, donor):
+                if n_tabu == tabuLength:
+                    for i in range(n_tabu - 1):
+                        tabu[i] = tabu[i + 1]
+                    n_tabu -= 1
+                tabu[n_tabu, 0] = poa
+                tabu[n_tabu, 1] = recipient
+                tabu[n_tabu, 2] = donor
+                n_tabu += 1
+            ni_move_ct = 0
+        else:
+            ni_move_ct += 1
+            prob = math.exp(diff / t)
+            make_move = prob > rng.random() and not _in_tabu(
+                tabu, n_tabu, poa, donor, recipient
+            )
+
+        n_potential = _remove(potential, n_potential, poa)
+        if make_move:
+            stats[4] += 1
+            objective += min_added - lost
+            # RegionDistanceSums.move
+            e = region_entries[donor]
+            while e != -1:
+                entry_value[e] += -1.0 * _dissimilarity(
+                    matrix, vector, n, poa, entry_area[e]
+                )
+                e = entry_rnext[e]
+            e = region_entries[recipient]
+            while e != -1:
+                entry_value[e] += _dissimilarity(matrix, vector, n, poa, entry_area[e])
+                e = entry_rnext[e]
+            valid[donor] = False
+            valid[recipient] = False
+            # Partition.move, unassign then append to the recipient
+            before = prv[poa]
+            after = nxt[poa]
+            if before == -1:
+                head[donor] = after
+            else:
+                nxt[before] = after
+            if after == -1:
+                tail[donor] = before
+            else:
+                prv[after] = before
+            size[donor] -= 1
+            spatial[donor] -= threshold_array[poa]
+            last = tail[recipient]
+            if last == -1:
+                head[recipient] = poa
+            else:
+                nxt[last] = poa
+            prv[poa] = last
+            nxt[poa] = -1
+            tail[recipient] = poa
+            labels[poa] = recipient
+            size[recipient] += 1
+            spatial[recipient] += threshold_array[poa]
+            kept = 0
+            for i in range(n_potential):
+                label = labels[potential[i]]
+                if label != recipient and label != donor:
+                    potential[kept] = potential[i]
+                    kept += 1
+            n_potential = kept
+        else:
+            stats[5] += 1
+
+        t = t * alpha
+    return objective
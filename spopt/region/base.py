@@ -1,8 +1,29 @@
 """Base classes for spopt/region"""
 
+from contextlib import contextmanager
+import collections
+import itertools
+import multiprocessing
 from libpysal.io.fileio import FileIO as psopen
+from scipy.spatial.distance import cdist, pdist, squareform
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 import numpy
 import networkx
+import os
+import time
+import tracemalloc
+
+# largest ``n`` for which the ``'auto'`` dissimilarity engine stores the full
+# ``(n, n)`` matrix (~200 MB of float64) or the condensed vector (~400 MB)
+DENSE_MAX_N = 5000
+CONDENSED_MAX_N = 10000
+
+# number of matrix entries computed at once by the on-demand engine (~8 MB)
+BLOCK_SIZE = 2 ** 20
+
+# per-process state of the worker pools started by ``_imap``
+_WORKER_STATE = {}
 
 
 class RegionMixin(object):
@@ -58,7 +79,339 @@ def w_to_g(w):
     return g
 
 
-def move_ok(area, source, destination, g, w):
+def w_to_csr(w):
+    """Get a ``scipy.sparse.csr_matrix`` adjacency from a PySAL W.
+
+    Rows and columns follow ``w.id_order`` and, unlike ``w.sparse``, the
+    column indices of each row keep the order of ``w.neighbors``.
+
+    Parameters
+    ----------
+
+    w : libpysal.weights.W
+        ...
+
+    Returns
+    -------
+
+    adjacency : scipy.sparse.csr_matrix
+        Binary ``(n, n)`` adjacency matrix.
+
+    """
+
+    id2i = w.id2i
+    indptr = numpy.zeros(w.n + 1, dtype=numpy.int64)
+    indices = []
+    for i, ego in enumerate(w.id_order):
+        indices.extend(id2i[alter] for alter in w.neighbors[ego])
+        indptr[i + 1] = len(indices)
+    indices = numpy.array(indices, dtype=numpy.int64)
+    data = numpy.ones(indices.size)
+    adjacency = csr_matrix((data, indices, indptr), shape=(w.n, w.n))
+    return adjacency
+
+
+def _region_adjacency(w, members):
+    """Adjacency of the subgraph induced by ``members``, read from
+    ``w.neighbors`` without building the adjacency of all areas.
+
+    Parameters
+    ----------
+
+    w : libpysal.weights.W
+        ...
+
+    members : array-like
+        Indices of the areas inducing the subgraph, e.g. a region.
+
+    Returns
+    -------
+
+    adjacency : scipy.sparse.csr_matrix
+        Binary adjacency whose rows and columns follow ``members``.
+
+    """
+
+    members = [int(m) for m in members]
+    local = {area: i for i, area in enumerate(members)}
+    indptr = numpy.zeros(len(members) + 1, dtype=numpy.int64)
+    indices = []
+    for i, area in enumerate(members):
+        indices.extend(local[j] for j in w.neighbors[area] if j in local)
+        indptr[i + 1] = len(indices)
+    indices = numpy.array(indices, dtype=numpy.int64)
+    data = numpy.ones(indices.size)
+    shape = (len(members), len(members))
+    adjacency = csr_matrix((data, indices, indptr), shape=shape)
+    return adjacency
+
+
+def _removable(members, w, adjacency=None):
+    """``removable_areas`` of ``members``, on the subgraph read from ``w``
+    when ``adjacency`` is ``None``.
+
+    """
+
+    members = numpy.asarray(members, dtype=int)
+    if adjacency is None:
+        adjacency = _region_adjacency(w, members)
+        return removable_areas(adjacency, numpy.arange(members.size))
+    return removable_areas(adjacency, members)
+
+
+def _biconnected(adjacency, members):
+    """Articulation points and connected components of the subgraph induced
+    by ``members`` in a single iterative depth-first search (Hopcroft-Tarjan).
+
+    Parameters
+    ----------
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the full graph.
+
+    members : array-like
+        Indices of the areas inducing the subgraph.
+
+    Returns
+    -------
+
+    is_cut : list
+        ``True`` for members whose removal disconnects their component.
+
+    component : list
+        Component index of every member.
+
+    """
+
+    indptr = adjacency.indptr
+    indices = adjacency.indices
+    members = [int(m) for m in members]
+    local = {area: i for i, area in enumerate(members)}
+    neighbors = [
+        [
+            local[j]
+            for j in indices[indptr[area] : indptr[area + 1]].tolist()
+            if j in local
+        ]
+        for area in members
+    ]
+
+    m = len(members)
+    disc = [-1] * m
+    low = [0] * m
+    parent = [-1] * m
+    component = [-1] * m
+    is_cut = [False] * m
+    timer = 0
+    n_components = 0
+    for root in range(m):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        component[root] = n_components
+        root_children = 0
+        stack = [(root, iter(neighbors[root]))]
+        while stack:
+            v, remaining = stack[-1]
+            for u in remaining:
+                if disc[u] == -1:
+                    parent[u] = v
+                    disc[u] = low[u] = timer
+                    timer += 1
+                    component[u] = n_components
+                    if v == root:
+                        root_children += 1
+                    stack.append((u, iter(neighbors[u])))
+                    break
+                elif u != parent[v] and disc[u] < low[v]:
+                    low[v] = disc[u]
+            else:
+                stack.pop()
+                if stack:
+                    p = stack[-1][0]
+                    if low[v] < low[p]:
+                        low[p] = low[v]
+                    if p != root and low[v] >= disc[p]:
+                        is_cut[p] = True
+        if root_children > 1:
+            is_cut[root] = True
+        n_components += 1
+    return is_cut, component
+
+
+def articulation_points(adjacency, members):
+    """Find the articulation points of the subgraph induced by ``members``.
+
+    Parameters
+    ----------
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the full graph, e.g. from ``w_to_csr``.
+
+    members : array-like
+        Indices of the areas inducing the subgraph, e.g. a region.
+
+    Returns
+    -------
+
+    _articulation_points_ : numpy.ndarray
+        Members whose removal increases the number of connected components.
+
+    """
+
+    members = numpy.asarray(members, dtype=int)
+    is_cut, _ = _biconnected(adjacency, members)
+    _articulation_points_ = members[numpy.array(is_cut, dtype=bool)]
+    return _articulation_points_
+
+
+def removable_areas(adjacency, members):
+    """Flag the members whose removal leaves the remaining members connected.
+
+    All members are classified with one linear-time pass instead of one
+    connectivity check per member.
+
+    Parameters
+    ----------
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the full graph, e.g. from ``w_to_csr``.
+
+    members : array-like
+        Indices of the areas inducing the subgraph, e.g. a region.
+
+    Returns
+    -------
+
+    removable : numpy.ndarray
+        Boolean array aligned with ``members``. A single member is never
+        removable since nothing connected would be left.
+
+    """
+
+    members = numpy.asarray(members, dtype=int)
+    removable = numpy.zeros(members.size, dtype=bool)
+    if members.size < 2:
+        return removable
+    is_cut, component = _biconnected(adjacency, members)
+    component = numpy.array(component)
+    n_components = component.max() + 1
+    if n_components == 1:
+        removable = ~numpy.array(is_cut, dtype=bool)
+    elif n_components == 2:
+        # dropping an isolated member reconnects the rest
+        sizes = numpy.bincount(component)
+        removable = sizes[component] == 1
+    return removable
+
+
+def label_components(adjacency, labels):
+    """Split every labelled group of areas into its connected pieces.
+
+    Parameters
+    ----------
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the full graph, e.g. from ``w_to_csr``.
+
+    labels : array-like
+        Group of every area. Areas with a negative label belong to no group
+        and each forms a piece of its own.
+
+    Returns
+    -------
+
+    pieces : numpy.ndarray
+        Piece ID of every area, numbered from ``0`` in order of the first
+        area of each piece. Areas share a piece when a path within their
+        group connects them.
+
+    """
+
+    labels = numpy.asarray(labels)
+    n = labels.size
+    rows = numpy.repeat(numpy.arange(n), numpy.diff(adjacency.indptr))
+    cols = adjacency.indices
+    within = (labels[rows] >= 0) & (labels[rows] == labels[cols])
+    graph = csr_matrix(
+        (numpy.ones(within.sum()), (rows[within], cols[within])), shape=(n, n)
+    )
+    _, pieces = connected_components(graph, directed=False)
+    return pieces
+
+
+def coarsen(adjacency, attr, sizes, limit, rng=None):
+    """Coarsen a graph by matching every node with at most one neighbor.
+
+    Nodes are visited in random order and an unmatched node is matched with
+    the unmatched neighbor of least cityblock attribute distance whose
+    combined size stays within ``limit``. Nodes without such a neighbor are
+    left on their own. This is one level of the usual multilevel graph
+    partitioning scheme and takes linear time in the number of edges.
+
+    Parameters
+    ----------
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the graph, e.g. from ``w_to_csr``.
+
+    attr : numpy.ndarray
+        Attribute values shaped ``(n_samples, n_features)``.
+
+    sizes : numpy.ndarray
+        Size of every node, e.g. its threshold variable.
+
+    limit : {int, float}
+        Largest allowed combined size of a matched pair.
+
+    rng : {None, int, numpy.random.Generator}
+        Random number generator or seed of the visiting order.
+        Default is ``None``.
+
+    Returns
+    -------
+
+    groups : numpy.ndarray
+        Coarse node of every node, numbered from ``0``.
+
+    coarse_adjacency : scipy.sparse.csr_matrix
+        Binary adjacency matrix of the coarse nodes.
+
+    """
+
+    attr = numpy.asarray(attr, dtype=float).reshape(len(sizes), -1)
+    n = len(sizes)
+    indptr = adjacency.indptr.tolist()
+    indices = adjacency.indices.tolist()
+    rows = numpy.repeat(numpy.arange(n), numpy.diff(adjacency.indptr))
+    cost = numpy.abs(attr[rows] - attr[adjacency.indices]).sum(axis=1).tolist()
+    sizes = numpy.asarray(sizes, dtype=float).tolist()
+    groups = [-1] * n
+    m = 0
+    for i in numpy.random.default_rng(rng).permutation(n).tolist():
+        if groups[i] >= 0:
+            continue
+        groups[i] = m
+        best, best_cost = -1, numpy.inf
+        for e in range(indptr[i], indptr[i + 1]):
+            j = indices[e]
+            if groups[j] < 0 and sizes[i] + sizes[j] <= limit and cost[e] < best_cost:
+                best, best_cost = j, cost[e]
+        if best >= 0:
+            groups[best] = m
+        m += 1
+
+    groups = numpy.array(groups, dtype=numpy.int64)
+    projection = csr_matrix((numpy.ones(n), (numpy.arange(n), groups)), shape=(n, m))
+    coarse_adjacency = (projection.T @ adjacency @ projection).tocsr()
+    coarse_adjacency.setdiag(0)
+    coarse_adjacency.eliminate_zeros()
+    coarse_adjacency.data[:] = 1.0
+    return groups, coarse_adjacency
+
+
+def move_ok(area, source, destination, g, w, adjacency=None):
     """Check if area can move from source region to destination region.
     
     Parameters
@@ -74,11 +427,16 @@ def move_ok(area, source, destination, g, w):
         ...
     
     g : networkx.Graph
-        ...
+        Not used, the connectivity is checked on ``adjacency``.
     
     w : libpysal.weights.W
         ...
     
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``w`` from ``w_to_csr``. When ``None`` (default) only
+        the subgraph of ``source`` is read from ``w``, pass it when checking
+        many moves.
+    
     Returns
     -------
     
@@ -90,20 +448,24 @@ def move_ok(area, source, destination, g, w):
     _move_ok_ = False
     
     # first check if area has a neighbor in destination
-    if not is_neighbor(area, destination, w):
+    if not is_neighbor(area, destination, w, adjacency=adjacency):
         return _move_ok_
     # check if moving area would break source connectivity
-    new_source = [j for j in source if j != area]
-    if networkx.is_connected(g.subgraph(new_source)):
-        _move_ok_ = True
-        return _move_ok_
-    else:
-        return _move_ok_
+    source = numpy.asarray(source, dtype=int)
+    removable = _removable(source, w, adjacency=adjacency)
+    _move_ok_ = bool(removable[source == area].any())
+    return _move_ok_
 
 
-def ok_moves(candidates, regions, labels_, closest, g, w, areas):
+def ok_moves(candidates, regions, labels_, closest, g, w, areas, adjacency=None):
     """Check a sequence of candidate moves.
     
+    Every move is checked against the current regions, as in ``move_ok``.
+    The members that can leave a region without disconnecting it are found
+    once per source region by ``removable_areas`` and the neighbors in the
+    destination regions are looked up in ``adjacency`` for all candidates
+    at once, so the check is linear in the size of the regions involved.
+    
     Parameters
     ----------
     
@@ -111,7 +473,7 @@ def ok_moves(candidates, regions, labels_, closest, g, w, areas):
         ...
     
     regions : 
-        ...
+        Members of every region, indexed by label.
     
     labels_ : 
         ...
@@ -120,7 +482,7 @@ def ok_moves(candidates, regions, labels_, closest, g, w, areas):
         ...
     
     g : networkx.Graph
-        ...
+        Not used, the connectivity is checked on ``adjacency``.
     
     w : libpysal.weights.W
         ...
@@ -128,6 +490,11 @@ def ok_moves(candidates, regions, labels_, closest, g, w, areas):
     areas : 
         ...
     
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``w`` from ``w_to_csr``. When ``None`` (default) the
+        neighbors and the subgraphs of the source regions are read from
+        ``w``.
+    
     Returns
     -------
     
@@ -136,12 +503,29 @@ def ok_moves(candidates, regions, labels_, closest, g, w, areas):
     
     """
     
-    keep = []
-    for area in candidates:
-        source = areas[labels_ == labels_[area]]
-        destination = regions[closest[area]]
-        if move_ok(area, source, destination, g, w):
-            keep.append(area)
+    candidates = numpy.asarray(candidates, dtype=int)
+    labels_ = numpy.asarray(labels_)
+    closest = numpy.asarray(closest)
+    if candidates.size == 0:
+        return []
+    # candidates with a neighbor in their destination region
+    if adjacency is None:
+        sizes = [len(w.neighbors[area]) for area in candidates.tolist()]
+        indices = [j for area in candidates.tolist() for j in w.neighbors[area]]
+        indices = numpy.array(indices, dtype=int)
+    else:
+        rows = adjacency[candidates]
+        sizes, indices = numpy.diff(rows.indptr), rows.indices
+    owner = numpy.repeat(numpy.arange(candidates.size), sizes)
+    hits = labels_[indices] == closest[candidates][owner]
+    neighboring = numpy.zeros(candidates.size, dtype=bool)
+    neighboring[owner[hits]] = True
+    # members that can leave their region, one pass per source region
+    movable = numpy.zeros(labels_.size, dtype=bool)
+    for region in numpy.unique(labels_[candidates[neighboring]]).tolist():
+        members = numpy.fromiter(regions[region], dtype=int)
+        movable[members[_removable(members, w, adjacency=adjacency)]] = True
+    keep = candidates[neighboring & movable[candidates]].tolist()
     return keep
 
 
@@ -194,27 +578,58 @@ def _centroid(regions, data):
     return _centroid_
 
 
-def _closest(data, centroids):
+def _closest(data, centroids, block_size=BLOCK_SIZE, dtype=numpy.float64):
     """For each row in data, find the closest row in centroids.
-    
+
+    Squared distances are expanded as ``|x|^2 - 2 x.c + |c|^2``, where
+    ``|x|^2`` does not change the closest centroid and ``x.c`` is one matrix
+    product per block of rows. Both sides are first shifted by the mean
+    centroid to limit the cancellation of the expansion.
+
     Parameters
     ----------
-    
-    data : 
-        ...
-    
-    centroids : 
-        ...
-    
+
+    data : numpy.ndarray
+        The observations shaped ``(n_samples, n_features)``.
+
+    centroids : numpy.ndarray
+        The centroids shaped ``(k, n_features)``.
+
+    block_size : int
+        Most distances computed at once, the blocks have
+        ``block_size // k`` rows. Default is ``BLOCK_SIZE``.
+
+    dtype : numpy.dtype
+        Precision of the distances, ``numpy.float32`` halves the memory and
+        is faster but may break near ties differently.
+        Default is ``numpy.float64``.
+
     Returns
     -------
-    
-    _closest_ : list
-        ...
-    
+
+    _closest_ : numpy.ndarray
+        Index of the closest centroid of every row, ties going to the lowest
+        index. Centroids with non-finite values, e.g. of empty regions, are
+        skipped.
+
     """
-    
-    _closest_ = [numpy.argmin(((row - centroids) ** 2).sum(axis=1)) for row in data]
+
+    data = numpy.asarray(data)
+    centroids = numpy.asarray(centroids)
+    # the NaN centroid of an empty region is never the closest
+    finite = numpy.isfinite(centroids).all(axis=1)
+    shift = numpy.zeros(centroids.shape[1])
+    if finite.any():
+        shift = centroids[finite].mean(axis=0)
+    centroids = numpy.where(finite[:, None], centroids - shift, 0).astype(dtype)
+    norms = (centroids ** 2).sum(axis=1)
+    norms[~finite] = numpy.inf
+    rows = max(1, block_size // max(1, len(centroids)))
+    _closest_ = numpy.empty(len(data), dtype=int)
+    for start in range(0, len(data), rows):
+        block = (data[start : start + rows] - shift).astype(dtype)
+        distances = norms - 2 * (block @ centroids.T)
+        _closest_[start : start + rows] = distances.argmin(axis=1)
     return _closest_
 
 
@@ -242,7 +657,7 @@ def _seeds(areas, k):
     return _seeds_
 
 
-def is_neighbor(area, region, w):
+def is_neighbor(area, region, w, adjacency=None):
     """Check if area is a neighbor of any member of region.
     
     Parameters
@@ -257,6 +672,10 @@ def is_neighbor(area, region, w):
     w : libpysal.weights.W
         ...
     
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``w`` from ``w_to_csr``, which replaces the lookups in
+        ``w``. Default is ``None``.
+    
     Returns
     -------
     
@@ -266,10 +685,477 @@ def is_neighbor(area, region, w):
     
     """
     
-    neighboring = False
-    for member in region:
-        if area in w[member]:
-            neighboring = True
-            return neighboring
+    if adjacency is None:
+        neighbors = w.neighbors[area]
+    else:
+        indptr = adjacency.indptr
+        neighbors = adjacency.indices[indptr[area] : indptr[area + 1]]
+    neighboring = bool(numpy.isin(neighbors, list(region)).any())
     return neighboring
 
+
+class Dissimilarity(object):
+    """Base class for pairwise attribute dissimilarity engines.
+
+    The region solvers only ever need dissimilarities between an area and the
+    members of a region, or between the members of a region, so an engine
+    exposes those reductions instead of a full ``(n, n)`` matrix.
+
+    Parameters
+    ----------
+
+    attr : numpy.ndarray
+        Attribute values shaped ``(n_samples, n_features)``.
+
+    metric : str
+        Any metric understood by ``scipy.spatial.distance.cdist``.
+        Default is ``'cityblock'``.
+
+    Attributes
+    ----------
+
+    n : int
+        The number of areas.
+
+    """
+
+    def __init__(self, attr, metric="cityblock"):
+        attr = numpy.array(attr, dtype=float)
+        if attr.ndim == 1:
+            attr = attr.reshape(-1, 1)
+        self.attr = attr
+        self.metric = metric
+        self.n = attr.shape[0]
+
+    def block(self, rows, cols):
+        """Dissimilarities between ``rows`` and ``cols``.
+
+        Parameters
+        ----------
+
+        rows : array-like
+            Indices of the row areas.
+
+        cols : array-like
+            Indices of the column areas.
+
+        Returns
+        -------
+
+        _block_ : numpy.ndarray
+            Array shaped ``(len(rows), len(cols))``.
+
+        """
+
+        raise NotImplementedError
+
+    def row(self, i, cols):
+        """Dissimilarities between area ``i`` and the areas in ``cols``."""
+
+        _row_ = self.block([i], cols)[0]
+        return _row_
+
+    def row_sum(self, i, cols):
+        """Sum of dissimilarities between area ``i`` and the areas in ``cols``."""
+
+        _row_sum_ = self.row(i, cols).sum()
+        return _row_sum_
+
+    def within_sum(self, members):
+        """Sum of dissimilarities over all unordered pairs of ``members``.
+
+        The pairs are visited in row blocks of at most ``BLOCK_SIZE`` entries
+        so that large regions never materialize their full block.
+
+        """
+
+        members = numpy.asarray(members, dtype=int)
+        step = max(1, BLOCK_SIZE // max(1, members.size))
+        total = 0.0
+        for start in range(0, members.size, step):
+            total += self.block(members[start : start + step], members).sum()
+        _within_sum_ = total / 2
+        return _within_sum_
+
+    def update(self, rows, attr):
+        """Replace the attributes of the areas in ``rows`` and patch the
+        stored dissimilarities of only those areas.
+
+        Parameters
+        ----------
+
+        rows : array-like
+            Indices of the changed areas.
+
+        attr : array-like
+            New attribute values shaped ``(len(rows), n_features)``.
+
+        """
+
+        if self.attr is None:
+            raise ValueError(
+                "An engine built from a dissimilarity matrix cannot be updated."
+            )
+        rows = numpy.asarray(rows, dtype=int)
+        self.attr[rows] = numpy.asarray(attr, dtype=float).reshape(rows.size, -1)
+        self._update(rows)
+
+    def _update(self, rows):
+        pass
+
+    def subset(self, rows):
+        """Engine of the same kind over the areas in ``rows`` only."""
+
+        _subset_ = type(self)(self.attr[rows], metric=self.metric)
+        return _subset_
+
+    @classmethod
+    def estimate_nbytes(cls, n, n_features):
+        """Bytes held by an engine of ``n`` areas and ``n_features``
+        attributes, and the bytes its construction peaks at.
+
+        """
+
+        # plus one block of entries computed on demand
+        nbytes = 8 * n * n_features
+        return nbytes, nbytes + 8 * min(n * n, BLOCK_SIZE)
+
+
+class DenseDissimilarity(Dissimilarity):
+    """Dissimilarity engine backed by the full ``(n, n)`` matrix.
+
+    This is the fastest engine and the default for small problems.
+
+    """
+
+    def __init__(self, attr, metric="cityblock"):
+        super(DenseDissimilarity, self).__init__(attr, metric=metric)
+        self.matrix = squareform(pdist(self.attr, metric=metric))
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Wrap a precomputed square dissimilarity matrix."""
+
+        engine = cls.__new__(cls)
+        engine.attr = None
+        engine.metric = None
+        engine.matrix = numpy.asarray(matrix)
+        engine.n = engine.matrix.shape[0]
+        return engine
+
+    def block(self, rows, cols):
+        _block_ = self.matrix[numpy.ix_(rows, cols)]
+        return _block_
+
+    def row(self, i, cols):
+        _row_ = self.matrix[i, cols]
+        return _row_
+
+    def within_sum(self, members):
+        members = numpy.asarray(members, dtype=int)
+        _within_sum_ = self.matrix[members, :][:, members].sum() / 2
+        return _within_sum_
+
+    def _update(self, rows):
+        block = cdist(self.attr[rows], self.attr, metric=self.metric)
+        self.matrix[rows, :] = block
+        self.matrix[:, rows] = block.T
+
+    def subset(self, rows):
+        if self.attr is None:
+            return DenseDissimilarity.from_matrix(self.matrix[numpy.ix_(rows, rows)])
+        return super(DenseDissimilarity, self).subset(rows)
+
+    @classmethod
+    def estimate_nbytes(cls, n, n_features):
+        # squareform copies the pdist vector into the matrix
+        nbytes = 8 * n * (n_features + n)
+        return nbytes, nbytes + 4 * n * (n - 1)
+
+
+class CondensedDissimilarity(Dissimilarity):
+    """Dissimilarity engine backed by the condensed ``pdist`` vector.
+
+    Stores ``n * (n - 1) / 2`` entries, half of the dense matrix.
+
+    """
+
+    def __init__(self, attr, metric="cityblock"):
+        super(CondensedDissimilarity, self).__init__(attr, metric=metric)
+        self.vector = pdist(self.attr, metric=metric)
+
+    def _index(self, rows, cols):
+        """Positions in ``vector`` of the ``(rows, cols)`` block, ``0`` on
+        the diagonal, and the diagonal mask.
+
+        """
+
+        rows = numpy.asarray(rows, dtype=numpy.int64).reshape(-1, 1)
+        cols = numpy.asarray(cols, dtype=numpy.int64).reshape(1, -1)
+        lo = numpy.minimum(rows, cols)
+        hi = numpy.maximum(rows, cols)
+        same = lo == hi
+        index = self.n * lo - lo * (lo + 1) // 2 + hi - lo - 1
+        index[same] = 0
+        return index, same
+
+    def block(self, rows, cols):
+        index, same = self._index(rows, cols)
+        _block_ = self.vector[index]
+        _block_[same] = 0.0
+        return _block_
+
+    def _update(self, rows):
+        block = cdist(self.attr[rows], self.attr, metric=self.metric)
+        index, same = self._index(rows, numpy.arange(self.n))
+        self.vector[index[~same]] = block[~same]
+
+    @classmethod
+    def estimate_nbytes(cls, n, n_features):
+        nbytes = 8 * n * n_features + 4 * n * (n - 1)
+        return nbytes, nbytes
+
+
+class OnDemandDissimilarity(Dissimilarity):
+    """Dissimilarity engine that computes entries from the attributes on
+    request, keeping memory linear in ``n``.
+
+    """
+
+    def block(self, rows, cols):
+        _block_ = cdist(self.attr[rows], self.attr[cols], metric=self.metric)
+        return _block_
+
+
+DISSIMILARITY_ENGINES = {
+    "dense": DenseDissimilarity,
+    "condensed": CondensedDissimilarity,
+    "ondemand": OnDemandDissimilarity,
+}
+
+
+def dissimilarity_engine(attr, kind="auto", metric="cityblock"):
+    """Build a dissimilarity engine for a set of attributes.
+
+    Parameters
+    ----------
+
+    attr : numpy.ndarray
+        Attribute values shaped ``(n_samples, n_features)``.
+
+    kind : {str, Dissimilarity}
+        One of ``'auto'``, ``'dense'``, ``'condensed'`` or ``'ondemand'``,
+        or an already built engine, which is returned unchanged. ``'auto'``
+        picks ``'dense'`` up to ``DENSE_MAX_N`` areas, ``'condensed'`` up to
+        ``CONDENSED_MAX_N`` areas and ``'ondemand'`` beyond. Default is
+        ``'auto'``.
+
+    metric : str
+        Any metric understood by ``scipy.spatial.distance.cdist``.
+        Default is ``'cityblock'``.
+
+    Returns
+    -------
+
+    engine : Dissimilarity
+        The engine built for ``attr``.
+
+    """
+
+    if isinstance(kind, Dissimilarity):
+        return kind
+    kind = _engine_kind(len(attr), kind)
+    engine = DISSIMILARITY_ENGINES[kind](attr, metric=metric)
+    return engine
+
+
+def _engine_kind(n, kind="auto"):
+    """Name of the engine ``dissimilarity_engine`` builds for ``n`` areas."""
+
+    if kind == "auto":
+        if n <= DENSE_MAX_N:
+            kind = "dense"
+        elif n <= CONDENSED_MAX_N:
+            kind = "condensed"
+        else:
+            kind = "ondemand"
+    if kind not in DISSIMILARITY_ENGINES:
+        raise ValueError(
+            "Unknown dissimilarity engine '%s'. Choose one of 'auto', %s."
+            % (kind, ", ".join("'%s'" % k for k in DISSIMILARITY_ENGINES))
+        )
+    return kind
+
+
+def _as_dissimilarity(distance_matrix):
+    """Return ``distance_matrix`` as a ``Dissimilarity`` engine, wrapping a
+    plain square matrix in a ``DenseDissimilarity``.
+
+    """
+
+    if isinstance(distance_matrix, Dissimilarity):
+        return distance_matrix
+    return DenseDissimilarity.from_matrix(distance_matrix)
+
+
+def _n_jobs(n_jobs):
+    """Resolve ``n_jobs`` to a number of processes, counting negative values
+    back from the number of CPUs (``-1`` uses all of them).
+
+    """
+
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def _init_worker(func, state):
+    _WORKER_STATE["func"] = func
+    _WORKER_STATE["state"] = state
+
+
+def _run_worker(chunk):
+    func = _WORKER_STATE["func"]
+    state = _WORKER_STATE["state"]
+    return [func(task, state) for task in chunk]
+
+
+def _imap(func, tasks, state, n_jobs=1, chunksize=1):
+    """Lazily yield ``func(task, state)`` for every task, in order.
+
+    With ``n_jobs > 1`` the tasks run in a process pool and ``state`` is sent
+    once to every worker, where it persists across tasks, instead of once
+    per task. Only a few chunks of ``chunksize`` tasks are queued ahead of
+    the consumer, and closing the generator early terminates the workers,
+    which drops the remaining work. ``func`` must be a module level function.
+
+    """
+
+    n_jobs = _n_jobs(n_jobs)
+    if n_jobs == 1:
+        for task in tasks:
+            yield func(task, state)
+        return
+    tasks = iter(tasks)
+    chunks = iter(lambda: list(itertools.islice(tasks, chunksize)), [])
+    # unlike ``concurrent.futures``, takes an initializer on Python 3.6
+    pool = multiprocessing.Pool(
+        n_jobs, initializer=_init_worker, initargs=(func, state)
+    )
+    pending = collections.deque()
+    try:
+        for chunk in itertools.islice(chunks, 2 * n_jobs):
+            pending.append(pool.apply_async(_run_worker, (chunk,)))
+        while pending:
+            results = pending.popleft().get()
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(pool.apply_async(_run_worker, (chunk,)))
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+@contextmanager
+def _phase(name, timings=None, callback=None):
+    """Time a solver phase.
+
+    The wall-clock seconds are added to ``timings[name]`` and ``callback``
+    receives a ``'phase_start'`` and a ``'phase_end'`` event, each with the
+    ``'phase'`` name, the latter with its ``'seconds'``.
+
+    Parameters
+    ----------
+
+    name : str
+        Name of the phase.
+
+    timings : collections.Counter
+        Accumulated seconds per phase. Default is ``None``.
+
+    callback : callable
+        Called as ``callback(event, info)`` with the event name and a dict.
+        Default is ``None``.
+
+    """
+
+    if callback is not None:
+        callback("phase_start", {"phase": name})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if timings is not None:
+            timings[name] += seconds
+        if callback is not None:
+            callback("phase_end", {"phase": name, "seconds": seconds})
+
+
+class _MemoryRecorder(object):
+    """Progress callback that records the traced memory of every phase.
+
+    For every phase, ``memory[name]`` holds the ``'peak'`` bytes allocated
+    on top of those in use when the phase started, and the bytes
+    ``'retained'`` when it ended. A repeated phase keeps its largest peak and
+    its total retained bytes. Events are passed on to ``callback``.
+
+    """
+
+    def __init__(self, memory, callback=None):
+        self.memory = memory
+        self.callback = callback
+        # [start, peak] of the open phases, innermost last
+        self._open = []
+
+    def __call__(self, event, info):
+        if event == "phase_start":
+            current, peak = tracemalloc.get_traced_memory()
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], peak)
+            self._open.append([current, current])
+            _reset_peak()
+        elif event == "phase_end" and self._open:
+            current, peak = tracemalloc.get_traced_memory()
+            start, phase_peak = self._open.pop()
+            phase_peak = max(phase_peak, peak)
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], phase_peak)
+            record = self.memory.setdefault(info["phase"], {"peak": 0, "retained": 0})
+            record["peak"] = max(record["peak"], phase_peak - start)
+            record["retained"] += current - start
+        if self.callback is not None:
+            self.callback(event, info)
+
+
+def _reset_peak():
+    # Python < 3.9 cannot reset the peak, which then covers all earlier phases
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+@contextmanager
+def _memory_profile(callback=None, memory=None):
+    """Trace the memory of the solver phases into ``memory``.
+
+    Yields the callback to hand to the solver, ``callback`` itself when
+    ``memory`` is ``None``, otherwise a ``_MemoryRecorder`` that forwards
+    to it. ``tracemalloc`` traces the current process only, so the memory
+    of worker processes is not recorded.
+
+    """
+
+    if memory is None:
+        yield callback
+        return
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield _MemoryRecorder(memory, callback)
+    finally:
+        if started:
+            tracemalloc.stop()
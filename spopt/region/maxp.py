@@ -16,17 +16,309 @@ from .base import (
     _closest,
     _seeds,
     is_neighbor,
+    dissimilarity_engine,
+    _as_dissimilarity,
+    w_to_csr,
+    removable_areas,
+    label_components,
+    coarsen,
+    _imap,
+    _n_jobs,
+    _phase,
+    _memory_profile,
+    _engine_kind,
+    DISSIMILARITY_ENGINES,
 )
+from . import _sa_kernel
 
+from libpysal.weights import W
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import pdist, squareform
 import geopandas as gp
 import numpy as np
-from copy import deepcopy
-from scipy.sparse.csgraph import connected_components
+import pandas as pd
+from collections import Counter
+from contextlib import closing
+import hashlib
+import heapq
+import time
+import warnings
 
 ITERCONSTRUCT = 999
 ITERSA = 10
+# multilevel coarsening stops at this many nodes or when a level removes
+# fewer than 5% of the nodes
+MULTILEVEL_MIN_N = 1000
+MULTILEVEL_MIN_SHRINK = 0.05
+# approximate bytes per area of a Partition and of the working sets of one
+# construction trial and one simulated annealing run, measured with
+# tracemalloc and used by MaxPHeuristic.estimate_memory
+PARTITION_NBYTES = 24
+CONSTRUCTION_NBYTES = 400
+SA_NBYTES = 200
+
+
+def _seed_sequence(seed):
+    """Get a ``numpy.random.SeedSequence`` from ``seed``.
+
+    Without a seed the entropy is drawn from the global NumPy random state,
+    so results stay reproducible with ``numpy.random.seed``.
+
+    """
+
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if seed is None:
+        seed = np.random.randint(np.iinfo(np.int32).max)
+    return np.random.SeedSequence(seed)
+
+
+def _check_rng(rng):
+    """Get a ``numpy.random.Generator`` from ``rng``, drawing a seed from the
+    global NumPy random state when ``rng`` is ``None``.
+
+    """
+
+    if rng is None:
+        rng = np.random.randint(np.iinfo(np.int32).max)
+    return np.random.default_rng(rng)
+
+
+def _deadline(deadline, time_limit):
+    """The earlier of ``deadline`` and ``time_limit`` seconds from now, both
+    optional, as a ``time.perf_counter`` value or ``None``.
+
+    """
+
+    if time_limit is not None:
+        limit = time.perf_counter() + time_limit
+        deadline = limit if deadline is None else min(deadline, limit)
+    return deadline
+
+
+def _expired(deadline):
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def p_upper_bound(threshold_array, threshold):
+    """Upper bound on the number of regions, the total of the threshold
+    variable over ``threshold`` capped at the number of areas.
+
+    Parameters
+    ----------
+
+    threshold_array : numpy.ndarray
+        Threshold variable of every area.
+
+    threshold : {int, float}
+        The threshold value.
+
+    Returns
+    -------
+
+    bound : int
+        No partition has more regions.
+
+    """
+
+    threshold_array = np.asarray(threshold_array)
+    bound = int(min(threshold_array.sum() // threshold, threshold_array.size))
+    return bound
+
+
+class Partition(object):
+    """Compact array-backed partition of areas into regions.
+
+    Regions are numbered from ``1``, label ``0`` marks unassigned areas and
+    label ``-1`` areas set aside as enclaves. The members of each region form
+    a doubly linked list through ``next`` and ``prev`` that keeps insertion
+    order, so adding or removing an area is ``O(1)`` and a partition is a
+    handful of flat arrays that ``copy`` duplicates cheaply.
+
+    Parameters
+    ----------
+
+    threshold_array : numpy.ndarray
+        Threshold variable of every area. Kept by reference.
+
+    Attributes
+    ----------
+
+    labels : numpy.ndarray
+        ``int32`` region ID of every area.
+
+    spatial : numpy.ndarray
+        ``float64`` threshold total of every region, indexed by region ID.
+
+    size : numpy.ndarray
+        ``int32`` number of members of every region, indexed by region ID.
+
+    """
+
+    def __init__(self, threshold_array):
+        n = len(threshold_array)
+        self.threshold_array = threshold_array
+        self.labels = np.zeros(n, dtype=np.int32)
+        self.next = np.full(n, -1, dtype=np.int32)
+        self.prev = np.full(n, -1, dtype=np.int32)
+        self._resize(8)
+        self._members = {}
+
+    @classmethod
+    def from_labels(cls, labels, threshold_array):
+        """Build a partition from region IDs, members in order of area."""
+
+        labels = np.asarray(labels)
+        partition = cls(threshold_array)
+        partition.labels[labels < 0] = -1
+        order = np.argsort(labels, kind="stable")
+        regions, starts = np.unique(labels[order], return_index=True)
+        for region, members in zip(regions, np.split(order, starts[1:])):
+            if region > 0:
+                partition.extend(region, members)
+        return partition
+
+    def _resize(self, capacity):
+        old = getattr(self, "head", np.empty(0, dtype=np.int32)).size
+        head = np.full(capacity, -1, dtype=np.int32)
+        tail = np.full(capacity, -1, dtype=np.int32)
+        size = np.zeros(capacity, dtype=np.int32)
+        spatial = np.zeros(capacity)
+        if old:
+            head[:old] = self.head
+            tail[:old] = self.tail
+            size[:old] = self.size
+            spatial[:old] = self.spatial
+        self.head, self.tail, self.size, self.spatial = head, tail, size, spatial
+
+    @property
+    def p(self):
+        """The number of non-empty regions."""
+
+        return int(np.count_nonzero(self.size))
+
+    def regions(self):
+        """IDs of the non-empty regions in increasing order."""
+
+        return np.flatnonzero(self.size)
+
+    def members(self, region):
+        """Member areas of ``region`` in insertion order."""
+
+        members = self._members.get(region)
+        if members is None:
+            members = np.empty(self.size[region], dtype=np.int64)
+            area = self.head[region]
+            i = 0
+            while area != -1:
+                members[i] = area
+                area = self.next[area]
+                i += 1
+            self._members[region] = members
+        return members
+
+    def assign(self, area, region):
+        """Append unassigned ``area`` to ``region``."""
+
+        if region >= self.head.size:
+            self._resize(max(region + 1, 2 * self.head.size))
+        last = self.tail[region]
+        if last == -1:
+            self.head[region] = area
+        else:
+            self.next[last] = area
+        self.prev[area] = last
+        self.next[area] = -1
+        self.tail[region] = area
+        self.labels[area] = region
+        self.size[region] += 1
+        self.spatial[region] += self.threshold_array[area]
+        self._members.pop(region, None)
+
+    def unassign(self, area, label=0):
+        """Remove ``area`` from its region, relabelling it ``label``."""
+
+        region = self.labels[area]
+        before, after = self.prev[area], self.next[area]
+        if before == -1:
+            self.head[region] = after
+        else:
+            self.next[before] = after
+        if after == -1:
+            self.tail[region] = before
+        else:
+            self.prev[after] = before
+        self.prev[area] = self.next[area] = -1
+        self.labels[area] = label
+        self.size[region] -= 1
+        self.spatial[region] -= self.threshold_array[area]
+        self._members.pop(region, None)
+
+    def move(self, area, region):
+        """Move ``area`` from its current region to ``region``."""
+
+        self.unassign(area)
+        self.assign(area, region)
+
+    def extend(self, region, areas):
+        """Append the unassigned ``areas`` to ``region`` in order."""
+
+        areas = np.asarray(areas, dtype=np.int32)
+        if areas.size == 0:
+            return
+        if region >= self.head.size:
+            self._resize(max(region + 1, 2 * self.head.size))
+        last = self.tail[region]
+        if last == -1:
+            self.head[region] = areas[0]
+        else:
+            self.next[last] = areas[0]
+        self.prev[areas[0]] = last
+        self.prev[areas[1:]] = areas[:-1]
+        self.next[areas[:-1]] = areas[1:]
+        self.next[areas[-1]] = -1
+        self.tail[region] = areas[-1]
+        self.labels[areas] = region
+        self.size[region] += areas.size
+        self.spatial[region] += self.threshold_array[areas].sum()
+        self._members.pop(region, None)
+
+    def copy(self):
+        """Copy of the partition that shares only ``threshold_array``."""
+
+        partition = Partition.__new__(Partition)
+        partition.threshold_array = self.threshold_array
+        partition.labels = self.labels.copy()
+        partition.next = self.next.copy()
+        partition.prev = self.prev.copy()
+        capacity = (self.regions()[-1] + 1) if self.p else 1
+        partition.head = self.head[:capacity].copy()
+        partition.tail = self.tail[:capacity].copy()
+        partition.size = self.size[:capacity].copy()
+        partition.spatial = self.spatial[:capacity].copy()
+        partition._members = {}
+        return partition
+
+    def digest(self):
+        """Hash of the partition that ignores region numbering.
+
+        Regions are renumbered in order of their first area before hashing,
+        so two partitions with the same regions have the same digest.
+
+        """
+
+        values, first, inverse = np.unique(
+            self.labels, return_index=True, return_inverse=True
+        )
+        rank = np.empty(values.size, dtype=np.int32)
+        rank[np.argsort(first)] = np.arange(values.size, dtype=np.int32)
+        canonical = rank[inverse]
+        digest = hashlib.blake2b(canonical.tobytes(), digest_size=16).digest()
+        return digest
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_members"] = {}
+        return state
 
 
 def maxp(
@@ -39,6 +331,22 @@ def maxp(
     max_iterations_construction=ITERCONSTRUCT,
     max_iterations_sa=ITERSA,
     verbose=False,
+    dissimilarity="auto",
+    counters=None,
+    n_jobs=1,
+    seed=None,
+    target_objective=None,
+    time_limit=None,
+    time_limit_construction=None,
+    time_limit_sa=None,
+    max_p_bound=None,
+    initial_labels=None,
+    multilevel=False,
+    blocks="components",
+    pool_size=None,
+    callback=None,
+    timings=None,
+    sa_backend="python",
 ):
     """...Needs a short description...
     
@@ -73,6 +381,106 @@ def maxp(
         Set to ``True`` for reporting solution progress/debugging.
         Default is ``False``.
 
+    dissimilarity : {str, spopt.region.base.Dissimilarity}
+        How attribute dissimilarities are stored. One of ``'auto'``,
+        ``'dense'`` (full ``(n, n)`` matrix), ``'condensed'`` (``pdist``
+        vector) or ``'ondemand'`` (computed from the attributes when needed,
+        linear memory), or a prebuilt engine. Default is ``'auto'``, which
+        uses the dense matrix for small problems.
+
+    counters : collections.Counter
+        Accumulates solver statistics such as the movable area cache hits
+        and misses of the simulated annealing. Default is ``None``.
+
+    n_jobs : int
+        Number of processes for the construction trials and the simulated
+        annealing restarts, ``-1`` uses all CPUs. Default is ``1``.
+
+    seed : {None, int, numpy.random.SeedSequence}
+        Seed of the random streams. Each construction trial and each
+        (partition, restart) pair of the simulated annealing gets its own
+        stream spawned from it, so the result does not depend on ``n_jobs``.
+        Default is ``None``, which draws the seed from the global NumPy
+        random state.
+
+    target_objective : float
+        Stop the simulated annealing, cancelling the pending restarts, as
+        soon as the best total within-region dissimilarity is at most this
+        value. With ``blocks``, every block gets a share of the target in
+        proportion to its number of areas. Default is ``None``, which runs
+        every restart.
+
+    time_limit : float
+        Wall-clock budget in seconds of the whole solve. Budgets are checked
+        between construction trials and inside the simulated annealing, and
+        the best solution found so far is returned once one expires. At least
+        one construction trial always runs. Default is ``None``, no budget.
+
+    time_limit_construction : float
+        Wall-clock budget in seconds of the construction phase, within
+        ``time_limit``. Default is ``None``, no budget.
+
+    time_limit_sa : float
+        Wall-clock budget in seconds of the simulated annealing, within
+        ``time_limit``. When it expires before any restart finished the best
+        construction partition is returned. Default is ``None``, no budget.
+
+    max_p_bound : {None, int, str}
+        Stop the construction, cancelling the pending trials, as soon as a
+        trial reaches this many regions. ``'auto'`` uses ``p_upper_bound``,
+        the total of the threshold variable over ``threshold``, per block
+        with ``blocks``. An integer bound cannot be split over blocks and
+        raises a ``ValueError`` when the problem is split. Default is
+        ``None``, which runs every trial.
+
+    initial_labels : array-like
+        Region of every area to warm start from instead of running the
+        construction phase, e.g. the labels of an earlier solve. It is made
+        feasible by ``repair_partition``, with a warning when areas had to be
+        reassigned, and is the only starting partition of the simulated
+        annealing. Default is ``None``, which runs the construction phase.
+
+    multilevel : {bool, int}
+        Solve on a coarsened contiguity graph and refine the projected
+        solution level by level, see ``_multilevel``. ``True`` coarsens down
+        to about ``MULTILEVEL_MIN_N`` nodes, an integer sets the number of
+        coarsening levels. Default is ``False``.
+
+    blocks : {None, str}
+        Split the problem into independent subproblems whose regions can
+        never merge, solved one after another or in parallel, see
+        ``_solve_blocks``. ``'components'`` splits the connected components
+        of ``w``, the name of a column, e.g. a state code, additionally
+        splits by its values. Every subproblem gets its own dissimilarities,
+        so memory is quadratic in the size of the largest one only.
+        Default is ``'components'``, ``None`` solves the whole problem at
+        once.
+
+    pool_size : int
+        Most distinct construction partitions handed to the simulated
+        annealing, see ``construction_phase``. Default is ``None``, no limit.
+
+    callback : callable
+        Called as ``callback(event, info)`` to report progress, with the
+        event name and a dict. Phases send ``'phase_start'`` and
+        ``'phase_end'`` with the ``'phase'`` name and its ``'seconds'``,
+        the construction a ``'construction_trial'`` with the ``'trial'``
+        index and its ``'p'``, every simulated annealing restart an
+        ``'sa_run'`` with the ``'partition'``, ``'restart'`` and
+        ``'objective'``, and, with ``n_jobs=1`` only, every move evaluated
+        by ``performSA`` an ``'sa_iteration'``. Default is ``None``.
+
+    timings : collections.Counter
+        Accumulates the wall-clock seconds of the ``'dissimilarity'``,
+        ``'construction'``, ``'repair'`` and ``'sa'`` phases, and of the
+        ``'blocks'``, ``'multilevel'`` and ``'refine'`` phases of those
+        modes. Default is ``None``.
+
+    sa_backend : str
+        ``'python'`` or ``'numba'``, which runs the simulated annealing in a
+        compiled kernel with the same results, see ``performSA``.
+        Default is ``'python'``.
+
     Returns
     -------
 
@@ -84,21 +492,143 @@ def maxp(
     
     """
 
+    _sa_kernel.check_backend(sa_backend)
+    deadline = _deadline(None, time_limit)
+    if counters is None:
+        counters = Counter()
+    if timings is None:
+        timings = Counter()
     attr = gdf[attrs_name].values
     threshold_array = gdf[threshold_name].values
-    distance_matrix = squareform(pdist(attr, metric="cityblock"))
+    adjacency = w_to_csr(w)
     n, k = attr.shape
+    pieces = _blocks(gdf, blocks, adjacency)
+    if pieces is not None:
+        if max_p_bound is not None and max_p_bound != "auto":
+            raise ValueError(
+                "An integer max_p_bound cannot be split over the %d blocks, "
+                "use max_p_bound='auto' or blocks=None." % (pieces.max() + 1)
+            )
+        with _phase("blocks", timings, callback):
+            max_p, label = _solve_blocks(
+                pieces,
+                attr,
+                threshold_array,
+                adjacency,
+                threshold,
+                top_n,
+                _seed_sequence(seed),
+                deadline,
+                counters,
+                timings,
+                callback,
+                n_jobs,
+                max_iterations_construction=max_iterations_construction,
+                max_iterations_sa=max_iterations_sa,
+                verbose=verbose,
+                dissimilarity=dissimilarity,
+                time_limit_construction=time_limit_construction,
+                time_limit_sa=time_limit_sa,
+                max_p_bound=max_p_bound,
+                target_objective=target_objective,
+                initial_labels=initial_labels,
+                multilevel=multilevel,
+                pool_size=pool_size,
+                sa_backend=sa_backend,
+            )
+        return max_p, label
+    if isinstance(dissimilarity, str):
+        with _phase("dissimilarity", timings, callback):
+            distance_matrix = dissimilarity_engine(attr, dissimilarity)
+    else:
+        # prebuilt, the caller accounts for it
+        distance_matrix = dissimilarity_engine(attr, dissimilarity)
     arr = np.arange(n)
-    max_p, rl_list = construction_phase(
-        arr,
-        attr,
-        threshold_array,
-        distance_matrix,
-        w,
-        threshold,
-        top_n,
-        max_iterations_construction,
-    )
+    if max_p_bound == "auto":
+        max_p_bound = p_upper_bound(threshold_array, threshold)
+    if multilevel is not False:
+        if initial_labels is not None:
+            raise ValueError("initial_labels cannot be used with multilevel.")
+        with _phase("multilevel", timings, callback):
+            max_p, label = _multilevel(
+                attr,
+                threshold_array,
+                w,
+                adjacency,
+                distance_matrix,
+                threshold,
+                top_n,
+                None if multilevel is True else multilevel,
+                _seed_sequence(seed),
+                deadline,
+                counters,
+                timings,
+                callback,
+                max_iterations_construction=max_iterations_construction,
+                max_iterations_sa=max_iterations_sa,
+                verbose=verbose,
+                dissimilarity=(
+                    dissimilarity if isinstance(dissimilarity, str) else "auto"
+                ),
+                n_jobs=n_jobs,
+                time_limit_construction=time_limit_construction,
+                time_limit_sa=time_limit_sa,
+                max_p_bound=max_p_bound,
+                # a problem split into blocks never gets here, and the coarse
+                # graph has no block column
+                blocks=None if blocks is None else "components",
+                pool_size=pool_size,
+                sa_backend=sa_backend,
+            )
+        return max_p, label
+    # independent streams for the construction and the simulated annealing
+    construction_seed, sa_seed = _seed_sequence(seed).spawn(2)
+    rl_list = []
+    if initial_labels is not None:
+        with _phase("repair", timings, callback):
+            partition, repaired = repair_partition(
+                initial_labels,
+                threshold_array,
+                threshold,
+                distance_matrix,
+                w,
+                random_assign=top_n,
+                rng=np.random.default_rng(construction_seed),
+                adjacency=adjacency,
+            )
+        if not partition.p:
+            warnings.warn(
+                "No region of initial_labels meets the threshold, "
+                "running the construction phase instead."
+            )
+        else:
+            counters["warm_start_repairs"] += repaired
+            if repaired:
+                warnings.warn(
+                    "%d areas of initial_labels were reassigned to make the "
+                    "regions contiguous and meet the threshold." % repaired
+                )
+            max_p, rl_list = partition.p, [partition]
+    if not rl_list:
+        with _phase("construction", timings, callback):
+            max_p, rl_list = construction_phase(
+                arr,
+                attr,
+                threshold_array,
+                distance_matrix,
+                w,
+                threshold,
+                top_n,
+                max_iterations_construction,
+                n_jobs=n_jobs,
+                seed=construction_seed,
+                adjacency=adjacency,
+                deadline=_deadline(deadline, time_limit_construction),
+                max_p_bound=max_p_bound,
+                counters=counters,
+                pool_size=pool_size,
+                callback=callback,
+            )
 
     if verbose:
         print("max_p: ", max_p)
@@ -110,34 +640,69 @@ def maxp(
     best_obj_value = np.inf
     best_label = None
     best_fn = None
-
-    for irl, rl in enumerate(rl_list):
-        label, regionList, regionSpatialAttr = rl
-        if verbose:
-            print(irl)
-        for saiter in range(max_iterations_sa):
-            finalLabel, finalRegionList, finalRegionSpatialAttr = performSA(
-                label,
-                regionList,
-                regionSpatialAttr,
-                threshold_array,
-                w,
-                distance_matrix,
-                threshold,
-                alpha,
-                tabuLength,
-                max_no_move,
-            )
-            totalWithinRegionDistance = calculateWithinRegionDistance(
-                finalRegionList, distance_matrix
-            )
+    sa_deadline = _deadline(deadline, time_limit_sa)
+
+    state = {
+        "rl_list": rl_list,
+        "objectives": [
+            calculateWithinRegionDistance(rl, distance_matrix) for rl in rl_list
+        ],
+        "threshold_array": threshold_array,
+        "weight": w,
+        "distance_matrix": distance_matrix,
+        "threshold": threshold,
+        "alpha": alpha,
+        "tabuLength": tabuLength,
+        "max_no_move": max_no_move,
+        "adjacency": adjacency,
+        "deadline": sa_deadline,
+        # callbacks are not sent to worker processes
+        "callback": callback if _n_jobs(n_jobs) == 1 else None,
+        "sa_backend": sa_backend,
+    }
+    # one stream per (partition, restart) pair, so the result does not
+    # depend on n_jobs
+    tasks = [
+        (irl, saiter, restart_seed)
+        for irl, partition_seed in enumerate(sa_seed.spawn(len(rl_list)))
+        for saiter, restart_seed in enumerate(partition_seed.spawn(max_iterations_sa))
+    ]
+    # results are reduced in task order, ties keep the earliest run
+    results = _imap(_sa_run, tasks, state, n_jobs=n_jobs)
+    with _phase("sa", timings, callback), closing(results):
+        for task, run in zip(tasks, results):
+            irl, saiter, _ = task
+            finalLabel, totalWithinRegionDistance, runCounters = run
+            counters.update(runCounters)
+            counters["sa_restarts"] += 1
+            if callback is not None:
+                callback(
+                    "sa_run",
+                    {
+                        "partition": irl,
+                        "restart": saiter,
+                        "objective": totalWithinRegionDistance,
+                    },
+                )
             if verbose:
+                if saiter == 0:
+                    print(irl)
                 print("totalWithinRegionDistance after SA: ")
                 print(totalWithinRegionDistance)
             if totalWithinRegionDistance < best_obj_value:
                 best_obj_value = totalWithinRegionDistance
                 best_label = finalLabel
                 best_fn = irl
+            if target_objective is not None and best_obj_value <= target_objective:
+                break
+            if _expired(sa_deadline):
+                counters["time_limit_reached"] = 1
+                break
+    if best_label is None:
+        # no restart ran, fall back to the best construction partition
+        best_fn = int(np.argmin(state["objectives"]))
+        best_obj_value = state["objectives"][best_fn]
+        best_label = rl_list[best_fn].labels
     if verbose:
         print("best objective value:")
         print(best_obj_value)
@@ -145,6 +710,325 @@ def maxp(
     return max_p, best_label
 
 
+def _csr_to_w(adjacency):
+    """PySAL W with IDs ``0, ..., n - 1`` from a CSR adjacency matrix."""
+
+    indptr, indices = adjacency.indptr, adjacency.indices
+    neighbors = {
+        i: indices[indptr[i] : indptr[i + 1]].tolist()
+        for i in range(adjacency.shape[0])
+    }
+    w = W(neighbors, silence_warnings=True)
+    return w
+
+
+def _blocks(gdf, blocks, adjacency):
+    """Block of every area for the ``blocks`` option of ``maxp``.
+
+    Returns
+    -------
+
+    pieces : numpy.ndarray
+        Block of every area, numbered from ``0``, or ``None`` when the
+        problem is not split.
+
+    """
+
+    if blocks is None:
+        return None
+    if blocks == "components":
+        codes = np.zeros(adjacency.shape[0], dtype=int)
+    else:
+        codes = np.unique(gdf[blocks].values, return_inverse=True)[1]
+    pieces = label_components(adjacency, codes)
+    if pieces.max() == 0:
+        return None
+    return pieces
+
+
+def _solve_blocks(
+    pieces,
+    attr,
+    threshold_array,
+    adjacency,
+    threshold,
+    top_n,
+    seed,
+    deadline,
+    counters,
+    timings,
+    callback,
+    n_jobs,
+    **options
+):
+    """Solve every block with ``maxp`` and stitch the labels, the blocks
+    mode of ``maxp``.
+
+    Each block gets its own random stream, so the result does not depend on
+    ``n_jobs``. With at least as many blocks as processes the blocks are
+    spread over the processes, otherwise they are solved one after another
+    with all processes. Blocks whose threshold total is below ``threshold``
+    cannot hold a region and keep the label ``-1``.
+
+    Parameters
+    ----------
+
+    pieces : numpy.ndarray
+        Block of every area, numbered from ``0``. Blocks must be connected.
+
+    attr, threshold_array, adjacency, threshold, top_n, n_jobs :
+        The whole problem, as in ``maxp``.
+
+    seed : numpy.random.SeedSequence
+        Seed from which one stream per block is spawned.
+
+    deadline : float
+        ``time.perf_counter`` value at which the work stops, or ``None``.
+
+    counters : collections.Counter
+        Solver statistics, including the number of ``'blocks'``.
+
+    timings, callback :
+        Phase timings and progress callback, as in ``maxp``. The callback
+        only receives the events of blocks solved in this process.
+
+    options : dict
+        Further keyword arguments of ``maxp`` for every block.
+
+    Returns
+    -------
+
+    max_p : int
+        The total number of regions.
+
+    labels : numpy.ndarray
+        Region IDs for observations, unique across blocks.
+
+    """
+
+    order = np.argsort(pieces, kind="stable")
+    starts = np.flatnonzero(np.diff(pieces[order])) + 1
+    members = np.split(order, starts)
+    counters["blocks"] = len(members)
+    tasks = [
+        (rows, block_seed)
+        for rows, block_seed in zip(members, seed.spawn(len(members)))
+        if threshold_array[rows].sum() >= threshold
+    ]
+    inner_jobs = n_jobs if len(tasks) < _n_jobs(n_jobs) else 1
+    state = {
+        "attr": attr,
+        "threshold_array": threshold_array,
+        "adjacency": adjacency,
+        "threshold": threshold,
+        "top_n": top_n,
+        "deadline": deadline,
+        "n_jobs": inner_jobs,
+        "options": options,
+    }
+
+    labels = np.full(len(threshold_array), -1, dtype=np.int32)
+    max_p = 0
+    outer_jobs = 1 if inner_jobs != 1 else n_jobs
+    # callbacks are not sent to worker processes
+    state["callback"] = callback if _n_jobs(outer_jobs) == 1 else None
+    with closing(_imap(_block_run, tasks, state, n_jobs=outer_jobs)) as results:
+        for (rows, _), run in zip(tasks, results):
+            block_p, block_labels, block_counters, block_timings = run
+            counters.update(block_counters)
+            timings.update(block_timings)
+            block_labels = np.asarray(block_labels)
+            assigned = block_labels > 0
+            labels[rows[assigned]] = block_labels[assigned] + max_p
+            max_p += block_p
+    return max_p, labels
+
+
+def _block_run(task, state):
+    """Solve one block of ``_solve_blocks`` with ``maxp``.
+
+    Returns
+    -------
+
+    run : tuple
+        The number of regions, the labels of the block, and the statistics
+        and phase timings ``collections.Counter`` of the block.
+
+    """
+
+    rows, seed = task
+    options = dict(state["options"])
+    if not isinstance(options["dissimilarity"], str):
+        options["dissimilarity"] = options["dissimilarity"].subset(rows)
+    if options["initial_labels"] is not None:
+        options["initial_labels"] = np.asarray(options["initial_labels"])[rows]
+    if options["target_objective"] is not None:
+        # the shares of the blocks add up to the target of the whole problem
+        share = len(rows) / len(state["threshold_array"])
+        options["target_objective"] = options["target_objective"] * share
+    time_limit = None
+    if state["deadline"] is not None:
+        time_limit = max(0.0, state["deadline"] - time.perf_counter())
+    block = pd.DataFrame(state["attr"][rows])
+    block["threshold"] = state["threshold_array"][rows]
+    counters = Counter()
+    timings = Counter()
+    max_p, labels = maxp(
+        block,
+        _csr_to_w(state["adjacency"][rows][:, rows]),
+        list(range(state["attr"].shape[1])),
+        "threshold",
+        state["threshold"],
+        state["top_n"],
+        counters=counters,
+        n_jobs=state["n_jobs"],
+        seed=seed,
+        time_limit=time_limit,
+        blocks=None,
+        callback=state["callback"],
+        timings=timings,
+        **options
+    )
+    run = max_p, labels, counters, timings
+    return run
+
+
+def _multilevel(
+    attr,
+    threshold_array,
+    w,
+    adjacency,
+    distance_matrix,
+    threshold,
+    top_n,
+    levels,
+    seed,
+    deadline,
+    counters,
+    timings,
+    callback,
+    **options
+):
+    """Coarsen, solve and refine, the multilevel mode of ``maxp``.
+
+    Neighboring areas are matched with ``spopt.region.base.coarsen`` into
+    nodes with at most half the threshold, so coarse nodes stay combinable
+    into regions. A node carries the mean attributes and the total
+    threshold variable of its areas. ``maxp`` solves the coarsest graph,
+    then the partition is projected down one level at a time and refined by
+    ``performSA`` with the moves of that level.
+
+    Parameters
+    ----------
+
+    attr, threshold_array, w, adjacency, distance_matrix, threshold, top_n :
+        The finest level, as in ``maxp``.
+
+    levels : int
+        Number of coarsening levels, ``None`` coarsens down to about
+        ``MULTILEVEL_MIN_N`` nodes.
+
+    seed : numpy.random.SeedSequence
+        Seed of the coarsening, the coarse solve and the refinements.
+
+    deadline : float
+        ``time.perf_counter`` value at which the work stops, or ``None``.
+
+    counters : collections.Counter
+        Solver statistics, including the number of ``'multilevel_levels'``.
+
+    timings, callback :
+        Phase timings and progress callback, as in ``maxp``.
+
+    options : dict
+        Further keyword arguments of ``maxp`` for the coarse solve.
+
+    Returns
+    -------
+
+    max_p : int
+        The number of regions.
+
+    labels : numpy.ndarray
+        Region IDs for observations.
+
+    """
+
+    coarsen_seed, solve_seed, refine_seed = seed.spawn(3)
+    rng = np.random.default_rng(coarsen_seed)
+    hierarchy = []
+    while levels is None or len(hierarchy) < levels:
+        n = len(threshold_array)
+        if levels is None and n <= MULTILEVEL_MIN_N:
+            break
+        groups, coarse_adjacency = coarsen(
+            adjacency, attr, threshold_array, threshold / 2, rng=rng
+        )
+        m = groups.max() + 1
+        if m > (1 - MULTILEVEL_MIN_SHRINK) * n:
+            break
+        hierarchy.append((groups, attr, threshold_array, w, adjacency))
+        counts = np.bincount(groups, minlength=m)
+        attr = np.column_stack(
+            [np.bincount(groups, weights=column, minlength=m) for column in attr.T]
+        ) / counts[:, None]
+        threshold_array = np.bincount(groups, weights=threshold_array, minlength=m)
+        adjacency = coarse_adjacency
+        w = _csr_to_w(adjacency)
+    counters["multilevel_levels"] = len(hierarchy)
+
+    kind = options.pop("dissimilarity")
+    coarse = pd.DataFrame(attr)
+    coarse["threshold"] = threshold_array
+    time_limit = None
+    if deadline is not None:
+        time_limit = max(0.0, deadline - time.perf_counter())
+    max_p, labels = maxp(
+        coarse,
+        w,
+        list(range(attr.shape[1])),
+        "threshold",
+        threshold,
+        top_n,
+        dissimilarity=kind if hierarchy else distance_matrix,
+        counters=counters,
+        seed=solve_seed,
+        time_limit=time_limit,
+        callback=callback,
+        timings=timings,
+        **options
+    )
+
+    for level, level_seed in zip(
+        reversed(hierarchy), refine_seed.spawn(len(hierarchy))
+    ):
+        groups, attr, threshold_array, w, adjacency = level
+        partition = Partition.from_labels(labels[groups], threshold_array)
+        if level is hierarchy[0]:
+            engine = distance_matrix
+        else:
+            engine = dissimilarity_engine(attr, kind)
+        with _phase("refine", timings, callback):
+            partition, _ = performSA(
+                partition,
+                threshold_array,
+                w,
+                engine,
+                threshold,
+                0.998,
+                10,
+                len(threshold_array),
+                adjacency=adjacency,
+                counters=counters,
+                rng=np.random.default_rng(level_seed),
+                deadline=deadline,
+                callback=callback,
+                backend=options["sa_backend"],
+            )
+        labels = partition.labels
+    return max_p, labels
+
+
 def construction_phase(
     arr,
     attr,
@@ -154,6 +1038,14 @@ def construction_phase(
     spatialThre,
     random_assign_choice,
     max_it=999,
+    n_jobs=1,
+    seed=None,
+    adjacency=None,
+    deadline=None,
+    max_p_bound=None,
+    counters=None,
+    pool_size=None,
+    callback=None,
 ):
     """...Needs a short description...
     
@@ -169,8 +1061,8 @@ def construction_phase(
     threshold_array : 
         ...
     
-    distance_matrix : 
-        ...
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
     
     weight : 
         ...
@@ -184,113 +1076,381 @@ def construction_phase(
     max_it : int
         Maximum number of iterations. Default is 999.
     
+    n_jobs : int
+        Number of processes the trials are spread over, ``-1`` uses all
+        CPUs. Default is ``1``.
+    
+    seed : {None, int, numpy.random.SeedSequence}
+        Seed from which one random stream per trial is spawned, making the
+        result independent of ``n_jobs``. Default is ``None``, which draws
+        the seed from the global NumPy random state.
+    
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``weight`` from ``spopt.region.base.w_to_csr``. Built
+        from ``weight`` when ``None`` (default).
+    
+    deadline : float
+        ``time.perf_counter`` value after which no further trial is started.
+        At least one trial always runs. Default is ``None``, no deadline.
+    
+    max_p_bound : int
+        Stop as soon as a trial reaches this many regions. Default is
+        ``None``, which runs every trial.
+    
+    counters : collections.Counter
+        Accumulates the number of ``'construction_trials'`` run and flags
+        ``'time_limit_reached'``. Default is ``None``.
+    
+    pool_size : int
+        Keep at most this many partitions, the first ones found. Default is
+        ``None``, no limit.
+    
+    callback : callable
+        Called as ``callback('construction_trial', info)`` after every
+        trial, with its ``'trial'`` index and its number of regions ``'p'``.
+        Default is ``None``.
+    
     Returns
     -------
     
     real_values : list
-        ``realmaxpv``, ``realLabelsList``
+        ``realmaxpv`` and ``realLabelsList``, the distinct ``Partition`` of
+        every trial that reached ``realmaxpv`` regions, up to ``pool_size``.
+        Repeated partitions are counted as ``'duplicate_partitions'``.
     
     """
     
-    labels_list = []
-    pv_list = []
-    max_p = 0
-    maxp_labels = None
-    maxp_regionList = None
-    maxp_regionSpatialAttr = None
+    if adjacency is None:
+        adjacency = w_to_csr(weight)
+    state = {
+        "arr": arr,
+        "threshold_array": threshold_array,
+        # plain lists index fastest in the region growing loop
+        "threshold_list": np.asarray(threshold_array).tolist(),
+        "adjacency": (adjacency.indptr.tolist(), adjacency.indices.tolist()),
+        "csr": adjacency,
+        "distance_matrix": distance_matrix,
+        "weight": weight,
+        "spatialThre": spatialThre,
+        "random_assign_choice": random_assign_choice,
+        "max_p": 0,
+        "deadline": deadline,
+    }
+    # one stream per trial, so the result does not depend on n_jobs
+    trial_seeds = _seed_sequence(seed).spawn(max_it)
+    chunksize = max(1, max_it // (4 * _n_jobs(n_jobs)))
+    trials = _imap(
+        _construction_trial, trial_seeds, state, n_jobs=n_jobs, chunksize=chunksize
+    )
 
-    for _ in range(max_it):
-        labels = [0] * len(threshold_array)
-        C = 0
-        regionSpatialAttr = {}
-        enclave = []
-        regionList = {}
-        np.random.shuffle(arr)
+    if counters is None:
+        counters = Counter()
+    realmaxpv = 0
+    realLabelsList = []
+    # digests of the pool, which only ever holds partitions of realmaxpv
+    seen = set()
+    with closing(trials):
+        for trial, (num_regions, partition) in enumerate(trials):
+            if num_regions is None:
+                # skipped by a worker past the deadline
+                continue
+            counters["construction_trials"] += 1
+            if callback is not None:
+                callback("construction_trial", {"trial": trial, "p": num_regions})
+            if num_regions > realmaxpv:
+                realmaxpv = num_regions
+                realLabelsList = []
+                seen = set()
+            if num_regions == realmaxpv:
+                digest = partition.digest()
+                if digest in seen:
+                    counters["duplicate_partitions"] += 1
+                elif pool_size is None or len(realLabelsList) < pool_size:
+                    seen.add(digest)
+                    realLabelsList.append(partition)
+            if max_p_bound is not None and realmaxpv >= max_p_bound:
+                break
+            if _expired(deadline):
+                counters["time_limit_reached"] = 1
+                break
+    if not realLabelsList:
+        # every trial was skipped, run the first one regardless of time
+        state["deadline"] = None
+        realmaxpv, partition = _construction_trial(trial_seeds[0], state)
+        realLabelsList.append(partition)
+        counters["construction_trials"] += 1
 
-        labeledID = []
+    real_values = [realmaxpv, realLabelsList]
+    return real_values
 
-        for arr_index in range(0, len(threshold_array)):
 
-            P = arr[arr_index]
-            if not (labels[P] == 0):
-                continue
+def _construction_trial(seed, state):
+    """Run one randomized greedy construction.
 
-            NeighborPolys = deepcopy(weight.neighbors[P])
+    Parameters
+    ----------
 
-            if len(NeighborPolys) < 0:
-                labels[P] = -1
-            else:
-                C += 1
-                labeledID, spatialAttrTotal = growClusterForPoly(
-                    labels, threshold_array, P, NeighborPolys, C, weight, spatialThre
-                )
+    seed : numpy.random.SeedSequence
+        Seed of the random stream of this trial.
 
-                if spatialAttrTotal < spatialThre:
-                    C -= 1
-                    enclave.extend(labeledID)
-                else:
-                    regionList[C] = labeledID
-                    regionSpatialAttr[C] = spatialAttrTotal
-        num_regions = len(regionList)
+    state : dict
+        Arguments of ``construction_phase`` shared by all trials, plus the
+        largest number of regions ``'max_p'`` seen so far by this process.
+
+    Returns
+    -------
 
-        for i, l in enumerate(labels):
-            if l == -1:
-                enclave.append(i)
+    trial : tuple
+        The number of regions and, if it is at least ``state['max_p']``, the
+        ``Partition`` with enclaves assigned, otherwise ``None``. Both are
+        ``None`` when ``state['deadline']`` has passed.
 
-        if num_regions < max_p:
+    """
+
+    if _expired(state["deadline"]):
+        trial = None, None
+        return trial
+    rng = np.random.default_rng(seed)
+    threshold_array = state["threshold_array"]
+    threshold_list = state["threshold_list"]
+    adjacency = state["adjacency"]
+    weight = state["weight"]
+    spatialThre = state["spatialThre"]
+
+    labels = [0] * len(threshold_array)
+    queued = bytearray(len(threshold_array))
+    C = 0
+    enclave = []
+    regionList = []
+    arr = rng.permutation(state["arr"]).tolist()
+
+    for arr_index in range(0, len(threshold_array)):
+
+        P = arr[arr_index]
+        if not (labels[P] == 0):
             continue
+
+        C += 1
+        labeledID, spatialAttrTotal = growClusterForPoly(
+            labels, threshold_list, P, C, adjacency, spatialThre, queued=queued
+        )
+
+        if spatialAttrTotal < spatialThre:
+            # set aside as enclaves, which later clusters cannot absorb
+            C -= 1
+            for ec in labeledID:
+                labels[ec] = -1
+            enclave.extend(labeledID)
         else:
-            max_p = num_regions
-            maxp_labels, maxp_regionList, maxp_regionSpatialAttr = assignEnclave(
-                enclave,
-                labels,
-                regionList,
-                regionSpatialAttr,
-                threshold_array,
-                weight,
-                distance_matrix,
-                random_assign=random_assign_choice,
-            )
-            pv_list.append(max_p)
-            labels_list.append([maxp_labels, maxp_regionList, maxp_regionSpatialAttr])
-    realLabelsList = []
-    realmaxpv = max(pv_list)
-    for ipv, pv in enumerate(pv_list):
-        if pv == realmaxpv:
-            realLabelsList.append(labels_list[ipv])
-    
-    real_values = [realmaxpv, realLabelsList]
-    return real_values
+            regionList.append(labeledID)
+    num_regions = len(regionList)
+
+    if num_regions < state["max_p"]:
+        trial = num_regions, None
+        return trial
+    state["max_p"] = num_regions
+    partition = Partition(threshold_array)
+    partition.labels[enclave] = -1
+    for C, labeledID in enumerate(regionList, 1):
+        partition.extend(C, labeledID)
+    partition = assignEnclave(
+        enclave,
+        partition,
+        threshold_array,
+        weight,
+        state["distance_matrix"],
+        random_assign=state["random_assign_choice"],
+        rng=rng,
+        adjacency=state["csr"],
+    )
+    trial = num_regions, partition
+    return trial
+
+
+def repair_partition(
+    labels,
+    threshold_array,
+    threshold,
+    distance_matrix,
+    weight,
+    random_assign=1,
+    rng=None,
+    adjacency=None,
+):
+    """Build a feasible ``Partition`` from an existing labelling, e.g. the
+    regions of an earlier solve on similar data.
+
+    Every region is split into its connected pieces. The piece with the
+    largest threshold total keeps the region if it meets ``threshold``, all
+    other areas become enclaves that ``assignEnclave`` merges into the
+    neighboring regions, so the repair only touches the violating areas.
+
+    Parameters
+    ----------
+
+    labels : array-like
+        Region of every area. Areas with a negative label are unassigned.
+
+    threshold_array : numpy.ndarray
+        Threshold variable of every area.
+
+    threshold : {int, float}
+        The threshold value.
+
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
+
+    weight : libpysal.weights.W
+        Spatial weights of the areas.
+
+    random_assign : int
+        Number of closest candidate regions an enclave is randomly assigned
+        to, see ``assignEnclave``. Default is 1.
+
+    rng : {None, int, numpy.random.Generator}
+        Random number generator or seed. Default is ``None``, which seeds a
+        generator from the global NumPy random state.
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``weight`` from ``spopt.region.base.w_to_csr``. Built
+        from ``weight`` when ``None`` (default).
+
+    Returns
+    -------
+
+    partition : Partition
+        The repaired partition with regions numbered from ``1``. It has no
+        regions when no piece meets ``threshold``.
+
+    repaired : int
+        The number of areas that had to be reassigned.
+
+    """
+
+    if adjacency is None:
+        adjacency = w_to_csr(weight)
+    threshold_array = np.asarray(threshold_array)
+    labels = np.asarray(labels)
+    if labels.shape != threshold_array.shape:
+        raise ValueError(
+            "Got %d labels for %d areas." % (labels.size, threshold_array.size)
+        )
+    pieces = label_components(adjacency, labels)
+    spatial = np.bincount(pieces, weights=threshold_array)
+    region = np.full(spatial.size, -1, dtype=labels.dtype)
+    region[pieces] = labels
+    # the piece with the largest threshold total of each region comes first
+    order = np.lexsort((-spatial, region))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = region[order[1:]] != region[order[:-1]]
+    keep = np.zeros(spatial.size, dtype=bool)
+    keep[order[first]] = True
+    keep &= (region >= 0) & (spatial >= threshold)
+
+    kept = keep[pieces]
+    new_labels = np.full(labels.size, -1, dtype=np.int32)
+    new_labels[kept] = np.unique(pieces[kept], return_inverse=True)[1] + 1
+    partition = Partition.from_labels(new_labels, threshold_array)
+    enclave = np.flatnonzero(~kept).tolist()
+    if partition.p:
+        partition = assignEnclave(
+            enclave,
+            partition,
+            threshold_array,
+            weight,
+            distance_matrix,
+            random_assign=random_assign,
+            rng=rng,
+            adjacency=adjacency,
+        )
+    repaired = len(enclave)
+    return partition, repaired
+
+
+def _sa_run(task, state):
+    """Run one simulated annealing restart of ``maxp``.
+
+    Parameters
+    ----------
+
+    task : tuple
+        Index of the partition in ``state['rl_list']``, index of the restart
+        and the ``numpy.random.SeedSequence`` of the restart.
+
+    state : dict
+        The candidate ``Partition`` list ``'rl_list'``, their ``'objectives'`` and
+        the arguments of ``performSA`` shared by all restarts.
+
+    Returns
+    -------
+
+    run : tuple
+        The final labels, their total within-region dissimilarity and the
+        statistics ``collections.Counter`` of the restart.
+
+    """
+
+    irl, saiter, seed = task
+    counters = Counter()
+    finalPartition, totalWithinRegionDistance = performSA(
+        state["rl_list"][irl],
+        state["threshold_array"],
+        state["weight"],
+        state["distance_matrix"],
+        state["threshold"],
+        state["alpha"],
+        state["tabuLength"],
+        state["max_no_move"],
+        initObjective=state["objectives"][irl],
+        adjacency=state["adjacency"],
+        counters=counters,
+        rng=np.random.default_rng(seed),
+        deadline=state["deadline"],
+        callback=state["callback"],
+        backend=state["sa_backend"],
+    )
+    run = finalPartition.labels, totalWithinRegionDistance, counters
+    return run
 
 
 def growClusterForPoly(
-    labels, threshold_array, P, NeighborPolys, C, weight, spatialThre
+    labels, threshold_array, P, C, adjacency, spatialThre, queued=None
 ):
-    """...Needs a short description...
+    """Grow cluster ``C`` from seed area ``P`` in breadth-first order until
+    its threshold total reaches ``spatialThre`` or no unassigned neighbor is
+    left.
+
+    The frontier is a list of area indices that is only ever appended to,
+    and a mask of queued areas replaces membership tests on the frontier, so
+    growing is linear in the number of areas reached.
     
     Parameters
     ----------
     
-    labels : 
-        ...
+    labels : list
+        Cluster ID of every area, ``0`` for unassigned areas. Updated in
+        place.
     
-    threshold_array : 
-        ...
+    threshold_array : list
+        Threshold variable of every area.
     
-    P : 
-        ...
+    P : int
+        The seed area.
     
-    NeighborPolys : 
-        ...
+    C : int
+        ID of the new cluster.
     
-    C : 
-        ...
+    adjacency : {scipy.sparse.csr_matrix, tuple}
+        Adjacency of the areas, either as a CSR matrix or as its ``indptr``
+        and ``indices`` arrays. Lists of ints are fastest.
     
-    weight : 
-        ...
+    spatialThre : {int, float}
+        The threshold value.
     
-    spatialThre : 
-        ...
+    queued : bytearray
+        Scratch mask of length ``n`` that is all zeros on entry and is left
+        all zeros on return. Passing one avoids an allocation per call.
+        Default is ``None``.
     
     Returns
     -------
@@ -299,10 +1459,21 @@ def growClusterForPoly(
         ``labeledID``, ``spatialAttrTotal``
     
     """
+    if hasattr(adjacency, "indptr"):
+        adjacency = (adjacency.indptr, adjacency.indices)
+    indptr, indices = adjacency
+    if queued is None:
+        queued = bytearray(len(labels))
+
     labels[P] = C
     labeledID = [P]
     spatialAttrTotal = threshold_array[P]
 
+    # the seed is not marked as queued, it is skipped as labelled instead
+    NeighborPolys = list(indices[indptr[P] : indptr[P + 1]])
+    for pn in NeighborPolys:
+        queued[pn] = 1
+
     i = 0
 
     while i < len(NeighborPolys):
@@ -316,11 +1487,14 @@ def growClusterForPoly(
             labeledID.append(Pn)
             spatialAttrTotal += threshold_array[Pn]
             if spatialAttrTotal < spatialThre:
-                PnNeighborPolys = weight.neighbors[Pn]
-                for pnn in PnNeighborPolys:
-                    if not pnn in NeighborPolys:
+                for pnn in indices[indptr[Pn] : indptr[Pn + 1]]:
+                    if not queued[pnn]:
+                        queued[pnn] = 1
                         NeighborPolys.append(pnn)
         i += 1
+
+    for pn in NeighborPolys:
+        queued[pn] = 0
     
     cluster_info = labeledID, spatialAttrTotal
     return cluster_info
@@ -328,15 +1502,21 @@ def growClusterForPoly(
 
 def assignEnclave(
     enclave,
-    labels,
-    regionList,
-    regionSpatialAttr,
+    partition,
     threshold_array,
     weight,
     distance_matrix,
     random_assign=1,
+    rng=None,
+    adjacency=None,
 ):
-    """...Needs a short description...
+    """Assign the enclaves to neighboring regions, one at a time.
+
+    The next enclave assigned is always the earliest one in ``enclave`` with
+    an assigned neighbor. Enclaves wait in a heap keyed by their position
+    and only the enclave neighbors of a newly assigned area are pushed, so
+    no full rescans are needed. Area-to-region dissimilarity sums are kept
+    in a ``RegionDistanceSums`` table that is updated as regions grow.
     
     Parameters
     ----------
@@ -344,14 +1524,8 @@ def assignEnclave(
     enclave : 
         ...
     
-    labels : 
-        ...
-    
-    regionList : 
-        ...
-    
-    regionSpatialAttr : 
-        ...
+    partition : Partition
+        Partition the enclaves are assigned into, updated in place.
     
     threshold_array : 
         ...
@@ -359,64 +1533,87 @@ def assignEnclave(
     weight : 
         ...
     
-    distance_matrix : 
-        ...
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
     
     random_assign : int
         ... ... Default is 1.
     
+    rng : {None, int, numpy.random.Generator}
+        Random number generator or seed. Default is ``None``, which seeds a
+        generator from the global NumPy random state.
+    
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``weight`` from ``spopt.region.base.w_to_csr``. Built
+        from ``weight`` when ``None`` (default).
+    
     Returns
     -------
     
-    region_info : list
-        Deep copies of ``labels``, ``regionList``, and ``regionSpatialAttr``
+    partition : Partition
+        The updated ``partition``. Enclaves without any path to a region
+        keep the label ``-1``.
     
     """
-    enclave_index = 0
-    while len(enclave) > 0:
-        ec = enclave[enclave_index]
-        ecNeighbors = weight.neighbors[ec]
-        minDistance = np.Inf
-        assignedRegion = 0
+    distance_matrix = _as_dissimilarity(distance_matrix)
+    rng = _check_rng(rng)
+    if adjacency is None:
+        adjacency = w_to_csr(weight)
+    indptr, indices = adjacency.indptr, adjacency.indices
+    labels = partition.labels
+    regionDistanceSums = RegionDistanceSums(distance_matrix, partition)
+
+    enclave = [int(ec) for ec in enclave]
+    inEnclave = np.zeros(len(labels), dtype=bool)
+    inEnclave[enclave] = True
+    position = {ec: i for i, ec in enumerate(enclave)}
+    queued = bytearray(len(enclave))
+    heap = []
+    for i, ec in enumerate(enclave):
+        if not inEnclave[indices[indptr[ec] : indptr[ec + 1]]].all():
+            queued[i] = 1
+            heap.append(i)
+
+    while heap:
+        ec = enclave[heapq.heappop(heap)]
+        ecNeighbors = indices[indptr[ec] : indptr[ec + 1]].tolist()
         ecNeighborsList = []
-        ecTopNeighborsList = []
 
         for ecn in ecNeighbors:
-            if ecn in enclave:
+            if inEnclave[ecn]:
                 continue
-            rm = np.array(regionList[labels[ecn]])
-            totalDistance = distance_matrix[ec, rm].sum()
+            totalDistance = regionDistanceSums.get(ec, labels[ecn])
             ecNeighborsList.append((ecn, totalDistance))
         ecNeighborsList = sorted(ecNeighborsList, key=lambda tup: tup[1])
         top_num = min([len(ecNeighborsList), random_assign])
-        if top_num > 0:
-            ecn_index = np.random.randint(top_num)
-            assignedRegion = labels[ecNeighborsList[ecn_index][0]]
+        ecn_index = rng.integers(top_num)
+        assignedRegion = labels[ecNeighborsList[ecn_index][0]]
 
-        if assignedRegion == 0:
-            enclave_index += 1
-        else:
-            labels[ec] = assignedRegion
-            regionList[assignedRegion].append(ec)
-            regionSpatialAttr[assignedRegion] += threshold_array[ec]
-            del enclave[enclave_index]
-            enclave_index = 0
+        regionDistanceSums.assign(ec, assignedRegion)
+        partition.assign(ec, assignedRegion)
+        inEnclave[ec] = False
+        for ecn in ecNeighbors:
+            if inEnclave[ecn] and not queued[position[ecn]]:
+                queued[position[ecn]] = 1
+                heapq.heappush(heap, position[ecn])
     
-    region_info = [deepcopy(labels), deepcopy(regionList), deepcopy(regionSpatialAttr)]
-    return region_info
+    return partition
 
 
-def calculateWithinRegionDistance(regionList, distance_matrix):
+def calculateWithinRegionDistance(partition, distance_matrix, regions=None):
     """...Needs a short description...
     
     Parameters
     ----------
     
-    regionList : 
+    partition : Partition
         ...
     
-    distance_matrix : 
-        ...
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
+    
+    regions : iterable
+        Only sum over these region IDs. Default is ``None``, all regions.
     
     Returns
     -------
@@ -426,36 +1623,111 @@ def calculateWithinRegionDistance(regionList, distance_matrix):
     
     """
     
+    distance_matrix = _as_dissimilarity(distance_matrix)
     totalWithinRegionDistance = 0
-    for k, v in regionList.items():
-        nv = np.array(v)
-        regionDistance = distance_matrix[nv, :][:, nv].sum() / 2
+    if regions is None:
+        regions = partition.regions()
+    for k in regions:
+        nv = partition.members(k)
+        regionDistance = distance_matrix.within_sum(nv)
         totalWithinRegionDistance += regionDistance
 
     return totalWithinRegionDistance
 
 
+class RegionDistanceSums(object):
+    """Table of summed dissimilarities between areas and regions.
+
+    Entry ``(i, r)`` is the sum of the dissimilarities between area ``i`` and
+    every member of region ``r``. Entries are computed the first time they
+    are requested and afterwards kept current by ``move``, which only touches
+    the cached entries of the two regions involved, so repeated lookups are
+    ``O(1)`` instead of ``O(|r|)``.
+
+    Parameters
+    ----------
+
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
+
+    partition : Partition
+        The table keeps a reference and expects the caller to update it
+        alongside ``move``.
+
+    """
+
+    def __init__(self, distance_matrix, partition):
+        self.distance_matrix = _as_dissimilarity(distance_matrix)
+        self.partition = partition
+        self._areas = {}
+        self._index = {}
+        self._sums = {}
+
+    def get(self, area, region):
+        """Sum of dissimilarities between ``area`` and the members of
+        ``region``.
+
+        """
+
+        index = self._index.setdefault(region, {})
+        pos = index.get(area)
+        if pos is not None:
+            return self._sums[region][pos]
+
+        value = self.distance_matrix.row_sum(area, self.partition.members(region))
+        areas = self._areas.setdefault(region, [])
+        sums = self._sums.get(region)
+        if sums is None or len(areas) == sums.size:
+            grown = np.empty(max(8, 2 * len(areas)))
+            if sums is not None:
+                grown[: sums.size] = sums
+            sums = self._sums[region] = grown
+        index[area] = len(areas)
+        sums[len(areas)] = value
+        areas.append(area)
+        return value
+
+    def move(self, area, donor, recipient):
+        """Update the cached entries of ``donor`` and ``recipient`` after
+        ``area`` moved from the former to the latter.
+
+        """
+
+        self._update(area, donor, -1)
+        self._update(area, recipient, 1)
+
+    def assign(self, area, region):
+        """Update the cached entries of ``region`` after the previously
+        unassigned ``area`` joined it.
+
+        """
+
+        self._update(area, region, 1)
+
+    def _update(self, area, region, sign):
+        areas = self._areas.get(region)
+        if areas:
+            delta = self.distance_matrix.row(area, np.array(areas))
+            self._sums[region][: len(areas)] += sign * delta
+
+
 def pickMoveArea(
-    labels,
-    regionLists,
-    regionSpatialAttrs,
+    partition,
     threshold_array,
     weight,
     distance_matrix,
     threshold,
+    adjacency=None,
+    movableAreas=None,
+    counters=None,
+    regions=None,
 ):
     """...Needs a short description...
     
     Parameters
     ----------
     
-    labels : 
-        ...
-    
-    regionLists : 
-        ...
-    
-    regionSpatialAttrs : 
+    partition : Partition
         ...
     
     threshold_array : 
@@ -467,6 +1739,24 @@ def pickMoveArea(
     threshold : 
         ...
     
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``weight`` from ``spopt.region.base.w_to_csr``. Built
+        from ``weight`` when ``None`` (default).
+    
+    movableAreas : dict
+        Cache of the movable areas of each region, keyed by region ID.
+        Regions found in the cache are not recomputed and newly computed
+        regions are added to it. The caller must drop the entries of every
+        region whose members or threshold total change. Default is ``None``.
+    
+    counters : collections.Counter
+        Accumulates ``'movable_area_cache_hits'`` and
+        ``'movable_area_cache_misses'``. Default is ``None``.
+    
+    regions : set
+        Only areas of these region IDs are considered. Default is ``None``,
+        all regions.
+    
     Returns
     -------
     
@@ -475,28 +1765,45 @@ def pickMoveArea(
     
     """
     
+    if adjacency is None:
+        adjacency = w_to_csr(weight)
+    if counters is None:
+        counters = Counter()
     potentialAreas = []
-    labels_array = np.array(labels)
-    for k, v in regionSpatialAttrs.items():
-        rla = np.array(regionLists[k])
+    for k in partition.regions():
+        if regions is not None and k not in regions:
+            continue
+        if movableAreas is not None and k in movableAreas:
+            counters["movable_area_cache_hits"] += 1
+            potentialAreas.extend(movableAreas[k])
+            continue
+        counters["movable_area_cache_misses"] += 1
+        regionAreas = []
+        rla = partition.members(k)
         rasa = threshold_array[rla]
-        lostSA = v - rasa
+        lostSA = partition.spatial[k] - rasa
         pas_indices = np.where(lostSA > threshold)[0]
         if pas_indices.size > 0:
+            removable = removable_areas(adjacency, rla)
             for pasi in pas_indices:
-                leftAreas = np.delete(rla, pasi)
-                ws = weight.sparse
-                cc = connected_components(ws[leftAreas, :][:, leftAreas])
-                if cc[0] == 1:
-                    potentialAreas.append(rla[pasi])
-        else:
-            continue
+                if removable[pasi]:
+                    regionAreas.append(rla[pasi])
+        if movableAreas is not None:
+            movableAreas[k] = regionAreas
+        potentialAreas.extend(regionAreas)
 
     return potentialAreas
 
 
 def checkMove(
-    poa, labels, regionLists, threshold_array, weight, distance_matrix, threshold
+    poa,
+    partition,
+    threshold_array,
+    weight,
+    distance_matrix,
+    threshold,
+    regionDistanceSums=None,
+    regions=None,
 ):
     """...Needs a short description...
     
@@ -506,10 +1813,7 @@ def checkMove(
     poa : 
         ...
     
-    labels : 
-        ...
-    
-    regionLists : 
+    partition : Partition
         ...
     
     threshold_array : 
@@ -518,12 +1822,20 @@ def checkMove(
     weight : 
         ...
     
-    distance_matrix : 
-        ...
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
     
     threshold : 
         ...
     
+    regionDistanceSums : RegionDistanceSums
+        Cached area-to-region dissimilarity sums. When ``None`` (default)
+        the sums are computed from ``distance_matrix``.
+    
+    regions : set
+        Only regions with these IDs are recipient candidates. Default is
+        ``None``, all regions.
+    
     Returns
     -------
     
@@ -533,19 +1845,25 @@ def checkMove(
     
     """
     
+    if regionDistanceSums is None:
+        regionDistanceSums = RegionDistanceSums(distance_matrix, partition)
+    labels = partition.labels
     poaNeighbor = weight.neighbors[poa]
     donorRegion = labels[poa]
 
-    rm = np.array(regionLists[donorRegion])
-    lostDistance = distance_matrix[poa, rm].sum()
+    lostDistance = regionDistanceSums.get(poa, donorRegion)
     potentialMove = None
 
     minAddedDistance = np.Inf
     for poan in poaNeighbor:
         recipientRegion = labels[poan]
+        if recipientRegion <= 0:
+            # unassignable enclave
+            continue
+        if regions is not None and recipientRegion not in regions:
+            continue
         if donorRegion != recipientRegion:
-            rm = np.array(regionLists[recipientRegion])
-            addedDistance = distance_matrix[poa, rm].sum()
+            addedDistance = regionDistanceSums.get(poa, recipientRegion)
 
             if addedDistance < minAddedDistance:
                 minAddedDistance = addedDistance
@@ -556,9 +1874,7 @@ def checkMove(
 
 
 def performSA(
-    initLabels,
-    initRegionList,
-    initRegionSpatialAttr,
+    initPartition,
     threshold_array,
     weight,
     distance_matrix,
@@ -566,20 +1882,22 @@ def performSA(
     alpha,
     tabuLength,
     max_no_move,
+    initObjective=None,
+    adjacency=None,
+    counters=None,
+    rng=None,
+    deadline=None,
+    regions=None,
+    callback=None,
+    backend="python",
 ):
     """...Needs a short description...
         
     Parameters
     ----------
     
-    initLabels : 
-        ...
-    
-    initRegionList : 
-        ...
-    
-    initRegionSpatialAttr : 
-        ...
+    initPartition : Partition
+        Starting partition, left unchanged.
     
     threshold_array : 
         ...
@@ -587,8 +1905,8 @@ def performSA(
     weight : 
         ...
     
-    distance_matrix : 
-        ...
+    distance_matrix : {numpy.ndarray, spopt.region.base.Dissimilarity}
+        Dissimilarity engine or square dissimilarity matrix.
     
     threshold : int
         ...
@@ -602,53 +1920,142 @@ def performSA(
     max_no_move : bool
         ...
     
+    initObjective : float
+        Total within-region dissimilarity of the initial partition. Computed
+        from ``distance_matrix`` when ``None`` (default).
+    
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of ``weight`` from ``spopt.region.base.w_to_csr``. Built
+        from ``weight`` when ``None`` (default).
+    
+    counters : collections.Counter
+        Accumulates the movable area cache statistics of ``pickMoveArea``,
+        the calls of ``'pickMoveArea_calls'`` and ``'checkMove_calls'`` and
+        the ``'sa_moves_accepted'`` and ``'sa_moves_rejected'``.
+        Default is ``None``.
+    
+    rng : {None, int, numpy.random.Generator}
+        Random number generator or seed. Default is ``None``, which seeds a
+        generator from the global NumPy random state.
+    
+    deadline : float
+        ``time.perf_counter`` value at which the annealing stops and returns
+        its current partition. Default is ``None``, no deadline.
+    
+    regions : set
+        Moves are restricted to areas of these region IDs and leave the
+        other regions untouched. ``initObjective`` and the returned objective
+        then cover only these regions. Default is ``None``, all regions.
+    
+    callback : callable
+        Called as ``callback('sa_iteration', info)`` after every evaluated
+        move, with the ``'iteration'``, the number of remaining
+        ``'candidates'``, the ``'move'``, whether it was ``'accepted'`` and
+        the ``'objective'``. Default is ``None``.
+    
+    backend : str
+        ``'python'`` or ``'numba'``, which runs the same moves in the
+        compiled kernel of ``spopt.region._sa_kernel``, without the
+        ``'sa_iteration'`` events. Falls back to ``'python'`` with a warning
+        when Numba is missing or ``distance_matrix`` computes the
+        dissimilarities on demand. Default is ``'python'``.
+    
     Returns
     -------
     
     sa_res : list
-        The results from simulated annealing including ``labels``,
-        ``regionLists``, and ``regionSpatialAttrs``.
+        The results from simulated annealing, the final ``Partition`` and its
+        total within-region dissimilarity ``objective``.
     
     """
     
+    distance_matrix = _as_dissimilarity(distance_matrix)
+    rng = _check_rng(rng)
+    if counters is None:
+        counters = Counter()
     t = 1
+    iteration = 0
     ni_move_ct = 0
     make_move_flag = False
     tabuList = []
     potentialAreas = []
 
-    labels = deepcopy(initLabels)
-    regionLists = deepcopy(initRegionList)
-    regionSpatialAttrs = deepcopy(initRegionSpatialAttr)
+    partition = initPartition.copy()
+    labels = partition.labels
+
+    # the objective is updated alongside each accepted move so the final
+    # value never has to be recomputed
+    if initObjective is None:
+        initObjective = calculateWithinRegionDistance(
+            partition, distance_matrix, regions=regions
+        )
+    objective = initObjective
+    if adjacency is None:
+        adjacency = w_to_csr(weight)
+    if _sa_kernel.resolve(backend, distance_matrix) == "numba":
+        objective = _sa_kernel.perform_sa(
+            partition,
+            distance_matrix,
+            threshold,
+            alpha,
+            tabuLength,
+            max_no_move,
+            objective,
+            adjacency,
+            counters,
+            rng,
+            deadline,
+            regions,
+        )
+        sa_res = [partition, objective]
+        return sa_res
+    regionDistanceSums = RegionDistanceSums(distance_matrix, partition)
+    # movable areas per region, only the donor and recipient regions of an
+    # accepted move are recomputed on the next call to pickMoveArea
+    movableAreas = {}
+    # whether any area of the last pick had a neighboring region to move to
+    has_candidates = True
 
     while ni_move_ct <= max_no_move:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
         if len(potentialAreas) == 0:
+            if not has_candidates:
+                # nothing changed since the last pick, which would repeat
+                break
+            has_candidates = False
+            counters["pickMoveArea_calls"] += 1
             potentialAreas = pickMoveArea(
-                labels,
-                regionLists,
-                regionSpatialAttrs,
+                partition,
                 threshold_array,
                 weight,
                 distance_matrix,
                 threshold,
+                adjacency=adjacency,
+                movableAreas=movableAreas,
+                counters=counters,
+                regions=regions,
             )
 
         if len(potentialAreas) == 0:
             break
-        poa = potentialAreas[np.random.randint(len(potentialAreas))]
+        poa = potentialAreas[rng.integers(len(potentialAreas))]
+        counters["checkMove_calls"] += 1
         lostDistance, minAddedDistance, potentialMove = checkMove(
             poa,
-            labels,
-            regionLists,
+            partition,
             threshold_array,
             weight,
             distance_matrix,
             threshold,
+            regionDistanceSums=regionDistanceSums,
+            regions=regions,
         )
 
         if potentialMove == None:
             potentialAreas.remove(poa)
             continue
+        has_candidates = True
 
         diff = lostDistance - minAddedDistance
         donorRegion = potentialMove[1]
@@ -665,18 +2072,19 @@ def performSA(
         else:
             ni_move_ct += 1
             prob = np.exp(diff / t)
-            if prob > np.random.random() and potentialMove not in tabuList:
+            if prob > rng.random() and potentialMove not in tabuList:
                 make_move_flag = True
             else:
                 make_move_flag = False
 
         potentialAreas.remove(poa)
         if make_move_flag:
-            labels[poa] = recipientRegion
-            regionLists[donorRegion].remove(poa)
-            regionLists[recipientRegion].append(poa)
-            regionSpatialAttrs[donorRegion] -= threshold_array[poa]
-            regionSpatialAttrs[recipientRegion] += threshold_array[poa]
+            counters["sa_moves_accepted"] += 1
+            objective += minAddedDistance - lostDistance
+            regionDistanceSums.move(poa, donorRegion, recipientRegion)
+            movableAreas.pop(donorRegion, None)
+            movableAreas.pop(recipientRegion, None)
+            partition.move(poa, recipientRegion)
 
             impactedAreas = []
             for pa in potentialAreas:
@@ -684,10 +2092,24 @@ def performSA(
                     impactedAreas.append(pa)
             for pa in impactedAreas:
                 potentialAreas.remove(pa)
+        else:
+            counters["sa_moves_rejected"] += 1
+        if callback is not None:
+            callback(
+                "sa_iteration",
+                {
+                    "iteration": iteration,
+                    "candidates": len(potentialAreas),
+                    "move": potentialMove,
+                    "accepted": make_move_flag,
+                    "objective": objective,
+                },
+            )
+        iteration += 1
 
         t = t * alpha
-    sa_res = [labels, regionLists, regionSpatialAttrs]
-    return [labels, regionLists, regionSpatialAttrs]
+    sa_res = [partition, objective]
+    return sa_res
 
 
 class MaxPHeuristic(BaseSpOptHeuristicSolver):
@@ -703,6 +2125,21 @@ class MaxPHeuristic(BaseSpOptHeuristicSolver):
         max_iterations_construction=99,
         max_iterations_sa=ITERSA,
         verbose=False,
+        dissimilarity="auto",
+        n_jobs=1,
+        seed=None,
+        target_objective=None,
+        time_limit=None,
+        time_limit_construction=None,
+        time_limit_sa=None,
+        max_p_bound=None,
+        initial_labels=None,
+        multilevel=False,
+        blocks="components",
+        pool_size=None,
+        callback=None,
+        profile_memory=False,
+        sa_backend="python",
     ):
         """
         
@@ -736,6 +2173,68 @@ class MaxPHeuristic(BaseSpOptHeuristicSolver):
         verbose : bool
             Default is ``False``.
         
+        dissimilarity : {str, spopt.region.base.Dissimilarity}
+            Storage of attribute dissimilarities, see ``maxp``.
+            Default is ``'auto'``.
+        
+        n_jobs : int
+            Number of processes for the construction trials and the simulated
+            annealing restarts, ``-1`` uses all CPUs. Default is ``1``.
+        
+        seed : {None, int, numpy.random.SeedSequence}
+            Seed of the random streams, see ``maxp``. Default is ``None``.
+        
+        target_objective : float
+            Stop the simulated annealing once the best objective reaches this
+            value. Default is ``None``.
+        
+        time_limit : float
+            Wall-clock budget in seconds of ``solve``, which then returns the
+            best solution found so far. Default is ``None``.
+        
+        time_limit_construction : float
+            Wall-clock budget in seconds of the construction phase.
+            Default is ``None``.
+        
+        time_limit_sa : float
+            Wall-clock budget in seconds of the simulated annealing.
+            Default is ``None``.
+        
+        max_p_bound : {None, int, str}
+            Stop the construction once a trial reaches this many regions,
+            ``'auto'`` uses ``p_upper_bound``. Default is ``None``.
+        
+        initial_labels : array-like
+            Region of every area to warm start the simulated annealing from,
+            skipping the construction phase, see ``maxp``.
+            Default is ``None``.
+        
+        multilevel : {bool, int}
+            Coarsen-solve-refine mode for very large problems, see ``maxp``.
+            Default is ``False``.
+        
+        blocks : {None, str}
+            Solve the connected components of ``w``, further split by the
+            values of this column if it is not ``'components'``, as
+            independent problems, see ``maxp``. Default is ``'components'``.
+        
+        pool_size : int
+            Most distinct construction partitions kept for the simulated
+            annealing. Default is ``None``, no limit.
+        
+        callback : callable
+            Called as ``callback(event, info)`` with the progress events of
+            ``maxp``. Default is ``None``.
+        
+        profile_memory : bool
+            Trace the memory of every phase of ``solve`` and ``update`` with
+            ``tracemalloc`` into ``memory_``. Tracing slows the solver down
+            and does not cover worker processes. Default is ``False``.
+        
+        sa_backend : str
+            ``'python'`` or ``'numba'`` simulated annealing of ``solve`` and
+            ``update``, see ``maxp``. Default is ``'python'``.
+        
         Attributes
         ----------
         
@@ -745,6 +2244,22 @@ class MaxPHeuristic(BaseSpOptHeuristicSolver):
         p : 
             ...
         
+        counters_ : collections.Counter
+            Solver statistics, e.g. ``'movable_area_cache_hits'`` and
+            ``'movable_area_cache_misses'`` of the simulated annealing, the
+            number of ``'construction_trials'`` and ``'sa_restarts'`` run,
+            ``'time_limit_reached'`` and ``'warm_start_repairs'``, the
+            accepted and rejected moves and the calls of the hot helpers.
+        
+        timings_ : collections.Counter
+            Wall-clock seconds of each phase, see ``maxp``, and of the whole
+            ``'solve'`` and every ``'update'``.
+        
+        memory_ : dict
+            With ``profile_memory``, the ``'peak'`` bytes allocated during
+            each phase and the bytes it ``'retained'``, keyed by the phases
+            of ``timings_``.
+        
         """
         self.gdf = gdf
         self.w = w
@@ -755,9 +2270,55 @@ class MaxPHeuristic(BaseSpOptHeuristicSolver):
         self.max_iterations_construction = max_iterations_construction
         self.max_iterations_sa = max_iterations_sa
         self.verbose = verbose
+        self.dissimilarity = dissimilarity
+        self.n_jobs = n_jobs
+        self.seed = seed
+        self.target_objective = target_objective
+        self.time_limit = time_limit
+        self.time_limit_construction = time_limit_construction
+        self.time_limit_sa = time_limit_sa
+        self.max_p_bound = max_p_bound
+        self.initial_labels = initial_labels
+        self.multilevel = multilevel
+        self.blocks = blocks
+        self.pool_size = pool_size
+        self.callback = callback
+        self.profile_memory = profile_memory
+        self.sa_backend = sa_backend
 
     def solve(self):
         """...Needs a short description..."""
+        counters = Counter()
+        timings = Counter()
+        memory = {} if self.profile_memory else None
+        with _memory_profile(self.callback, memory) as callback:
+            with _phase("solve", timings, callback):
+                max_p, label = self._solve(counters, timings, callback)
+        self.labels_ = label
+        self.p = max_p
+        self.counters_ = counters
+        self.timings_ = timings
+        if memory is not None:
+            self.memory_ = memory
+        self._threshold_array = np.array(self.gdf[self.threshold_name].values)
+        self._partition = Partition.from_labels(label, self._threshold_array)
+
+    def _solve(self, counters, timings, callback):
+        self._adjacency = w_to_csr(self.w)
+        self._dissimilarity = None
+        # kept so that ``update`` works block by block too
+        self._pieces = pieces = _blocks(self.gdf, self.blocks, self._adjacency)
+        self._block_rows = None
+        self._block_engines = {}
+        if pieces is not None:
+            order = np.argsort(pieces, kind="stable")
+            starts = np.flatnonzero(np.diff(pieces[order])) + 1
+            self._block_rows = np.split(order, starts)
+        if isinstance(self.dissimilarity, str) and pieces is not None:
+            # every block builds its own, the whole engine is never built
+            dissimilarity = self.dissimilarity
+        else:
+            dissimilarity = self._engine(timings, callback)
         max_p, label = maxp(
             self.gdf,
             self.w,
@@ -768,6 +2329,328 @@ class MaxPHeuristic(BaseSpOptHeuristicSolver):
             self.max_iterations_construction,
             self.max_iterations_sa,
             verbose=self.verbose,
+            dissimilarity=dissimilarity,
+            counters=counters,
+            n_jobs=self.n_jobs,
+            seed=self.seed,
+            target_objective=self.target_objective,
+            time_limit=self.time_limit,
+            time_limit_construction=self.time_limit_construction,
+            time_limit_sa=self.time_limit_sa,
+            max_p_bound=self.max_p_bound,
+            initial_labels=self.initial_labels,
+            multilevel=self.multilevel,
+            blocks=self.blocks,
+            pool_size=self.pool_size,
+            callback=callback,
+            timings=timings,
+            sa_backend=self.sa_backend,
         )
-        self.labels_ = label
-        self.p = max_p
+        return max_p, label
+
+    @classmethod
+    def estimate_memory(
+        cls,
+        n,
+        n_features,
+        dissimilarity="auto",
+        n_jobs=1,
+        max_iterations_construction=99,
+        pool_size=None,
+        n_neighbors=6,
+    ):
+        """Predict the memory ``solve`` needs before running it.
+
+        The estimate covers the arrays of the solver, not the input
+        GeoDataFrame and weights, and assumes the worst case of a full
+        partition pool.
+
+        Parameters
+        ----------
+
+        n : int
+            The number of areas.
+
+        n_features : int
+            The number of attributes.
+
+        dissimilarity : str
+            Dissimilarity engine, see ``maxp``. Default is ``'auto'``.
+
+        n_jobs : int
+            Number of processes, each holding its own copy of the
+            dissimilarities. Default is ``1``.
+
+        max_iterations_construction : int
+            Number of construction trials. Default is ``99``.
+
+        pool_size : int
+            Most construction partitions kept, see ``maxp``.
+            Default is ``None``.
+
+        n_neighbors : float
+            Average number of neighbors of an area. Default is ``6``.
+
+        Returns
+        -------
+
+        estimate : dict
+            Bytes of the ``'dissimilarity'`` engine, the CSR ``'adjacency'``,
+            the ``'pool'`` of construction partitions, the working sets of
+            the ``'construction'`` and the ``'sa'`` over all processes, the
+            ``'workers'`` copies of the shared state and the expected
+            ``'peak'`` of ``solve``.
+
+        """
+
+        kind = _engine_kind(n, dissimilarity)
+        engine, engine_peak = DISSIMILARITY_ENGINES[kind].estimate_nbytes(
+            n, n_features
+        )
+        adjacency = 12 * int(n * n_neighbors) + 4 * (n + 1)
+        pool = max_iterations_construction
+        if pool_size is not None:
+            pool = min(pool, pool_size)
+        processes = _n_jobs(n_jobs)
+        estimate = {
+            "dissimilarity": engine,
+            "adjacency": adjacency,
+            "pool": pool * PARTITION_NBYTES * n,
+            "construction": processes * CONSTRUCTION_NBYTES * n,
+            "sa": processes * SA_NBYTES * n,
+            "workers": (processes - 1) * (engine + adjacency),
+        }
+        # the engine is built before the phases run, one after another
+        working = max(estimate["construction"], estimate["sa"])
+        estimate["peak"] = (
+            adjacency
+            + estimate["workers"]
+            + max(engine_peak, engine + estimate["pool"] + working)
+        )
+        return estimate
+
+    def update(self, changed):
+        """Re-optimize a solved model after the attributes or the threshold
+        variable of a few areas changed.
+
+        Only the stored dissimilarities and region totals of the changed
+        areas are patched. Regions that fall below the threshold are repaired
+        with ``repair_partition``, then the simulated annealing runs on the
+        regions of the changed areas and their neighboring regions only, so
+        the work is proportional to the size of the change rather than to
+        the number of areas. A problem solved in ``blocks`` is updated block
+        by block, with the dissimilarities of the changed blocks only, so no
+        region crosses a block.
+
+        Parameters
+        ----------
+
+        changed : pandas.DataFrame
+            The changed rows, indexed like ``gdf``, with new values for any of
+            the ``attrs_name`` and ``threshold_name`` columns. ``gdf`` is
+            updated in place.
+
+        """
+
+        if not hasattr(self, "_partition"):
+            raise ValueError("The model must be solved before it is updated.")
+        memory = self.memory_ if self.profile_memory else None
+        with _memory_profile(self.callback, memory) as callback:
+            with _phase("update", self.timings_, callback):
+                self._update(changed, callback)
+
+    def _engine(self, timings=None, callback=None):
+        """The dissimilarity engine of all areas, built on first use and
+        kept with the partition so that ``update`` can patch it.
+
+        """
+
+        if self._dissimilarity is None:
+            with _phase("dissimilarity", timings, callback):
+                self._dissimilarity = dissimilarity_engine(
+                    self.gdf[self.attrs_name].values, self.dissimilarity
+                )
+        return self._dissimilarity
+
+    def _block_engine(self, block, timings=None, callback=None):
+        """The dissimilarity engine of the areas of ``block``, built on
+        first use and kept so that ``update`` can patch it.
+
+        """
+
+        engine = self._block_engines.get(block)
+        if engine is None:
+            rows = self._block_rows[block]
+            with _phase("dissimilarity", timings, callback):
+                if isinstance(self.dissimilarity, str):
+                    engine = dissimilarity_engine(
+                        self.gdf[self.attrs_name].values[rows], self.dissimilarity
+                    )
+                else:
+                    engine = self._engine().subset(rows)
+            self._block_engines[block] = engine
+        return engine
+
+    def _update(self, changed, callback):
+        rows = self.gdf.index.get_indexer(changed.index)
+        if (rows < 0).any():
+            raise ValueError("Changed rows are missing from the GeoDataFrame.")
+        blocks = []
+        if self._block_rows is None:
+            # built from the attributes before the change, patched below
+            self._engine(self.timings_, callback)
+        else:
+            blocks = np.unique(self._pieces[rows]).tolist()
+            for block in blocks:
+                self._block_engine(block, self.timings_, callback)
+        columns = [c for c in changed.columns if c in self.gdf.columns]
+        self.gdf.loc[changed.index, columns] = changed[columns].values
+
+        partition = self._partition
+        if set(self.attrs_name) & set(columns):
+            attr = self.gdf[self.attrs_name].values
+            if self._block_rows is None:
+                self._dissimilarity.update(rows, attr[rows])
+            for block in blocks:
+                block_rows = rows[self._pieces[rows] == block]
+                self._block_engines[block].update(
+                    np.searchsorted(self._block_rows[block], block_rows),
+                    attr[block_rows],
+                )
+        if self.threshold_name in columns:
+            new = self.gdf[self.threshold_name].values[rows]
+            assigned = partition.labels[rows] > 0
+            np.add.at(
+                partition.spatial,
+                partition.labels[rows[assigned]],
+                (new - self._threshold_array[rows])[assigned],
+            )
+            self._threshold_array[rows] = new
+
+        if self._block_rows is None:
+            partition = self._reoptimize(
+                partition,
+                self._threshold_array,
+                self._dissimilarity,
+                self.w,
+                self._adjacency,
+                rows,
+                callback,
+            )
+        for block in blocks:
+            self._update_block(partition, block, rows, callback)
+
+        self._partition = partition
+        self.labels_ = partition.labels.copy()
+        self.p = partition.p
+
+    def _update_block(self, partition, block, rows, callback):
+        """Re-optimize the regions of ``block`` on the edges within the
+        block only and write them back into ``partition``.
+
+        """
+
+        members = self._block_rows[block]
+        adjacency = self._adjacency[members][:, members]
+        threshold_array = self._threshold_array[members]
+        old = partition.labels[members]
+        local = self._reoptimize(
+            Partition.from_labels(old, threshold_array),
+            threshold_array,
+            self._block_engines[block],
+            _csr_to_w(adjacency),
+            adjacency,
+            np.searchsorted(members, rows[self._pieces[rows] == block]),
+            callback,
+        )
+        # a repair numbers the regions from 1, these take the unused IDs of
+        # the block first, then new ones
+        labels = local.labels.copy()
+        owned = np.unique(old[old > 0])
+        used = np.unique(labels[labels > 0])
+        foreign = np.setdiff1d(used, owned)
+        free = np.setdiff1d(owned, used).tolist()
+        next_id = int(partition.regions().max(initial=0)) + 1
+        for region in foreign.tolist():
+            if free:
+                new_id = free.pop(0)
+            else:
+                new_id, next_id = next_id, next_id + 1
+            labels[local.labels == region] = new_id
+        for area, label in zip(members[labels != old], labels[labels != old]):
+            if partition.labels[area] > 0:
+                partition.unassign(area, label=min(label, 0))
+            if label > 0:
+                partition.assign(area, label)
+            else:
+                partition.labels[area] = label
+
+    def _reoptimize(
+        self, partition, threshold_array, engine, w, adjacency, rows, callback
+    ):
+        """Repair the regions of ``partition`` that fell below the threshold,
+        then anneal the regions of the changed ``rows`` and their neighboring
+        regions.
+
+        """
+
+        affected = rows
+        regions = partition.regions()
+        infeasible = regions[partition.spatial[regions] < self.threshold]
+        if infeasible.size:
+            # dissolved areas join neighboring regions, which are affected
+            dissolved = np.flatnonzero(np.isin(partition.labels, infeasible))
+            labels = partition.labels.copy()
+            labels[dissolved] = -1
+            partition, repaired = repair_partition(
+                labels,
+                threshold_array,
+                self.threshold,
+                engine,
+                w,
+                random_assign=self.top_n,
+                rng=np.random.default_rng(_seed_sequence(self.seed)),
+                adjacency=adjacency,
+            )
+            self.counters_["warm_start_repairs"] += repaired
+            affected = np.union1d(rows, dissolved)
+
+        # regions of the changed areas and their neighboring regions
+        indptr, indices = adjacency.indptr, adjacency.indices
+        touched = set(partition.labels[affected].tolist())
+        for region in list(touched):
+            if region > 0:
+                for area in partition.members(region):
+                    neighbors = indices[indptr[area] : indptr[area + 1]]
+                    touched.update(partition.labels[neighbors].tolist())
+        active = {region for region in touched if region > 0}
+
+        n_active = sum(partition.size[region] for region in active)
+        initObjective = calculateWithinRegionDistance(
+            partition, engine, regions=active
+        )
+        best = None
+        seeds = _seed_sequence(self.seed).spawn(self.max_iterations_sa)
+        for restart_seed in seeds:
+            candidate, objective = performSA(
+                partition,
+                threshold_array,
+                w,
+                engine,
+                self.threshold,
+                0.998,
+                10,
+                n_active,
+                initObjective=initObjective,
+                adjacency=adjacency,
+                counters=self.counters_,
+                rng=np.random.default_rng(restart_seed),
+                regions=active,
+                callback=callback,
+                backend=self.sa_backend,
+            )
+            if best is None or objective < best[1]:
+                best = candidate, objective
+        if best is not None:
+            partition = best[0]
+        return partition
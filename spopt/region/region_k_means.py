@@ -1,19 +1,32 @@
-from collections import defaultdict
+from collections import Counter
 import numpy
 from ..BaseClass import BaseSpOptHeuristicSolver
 from .base import (
-    w_to_g,
     move_ok,
     ok_moves,
-    region_neighbors,
-    _centroid,
     _closest,
     _seeds,
     is_neighbor,
+    _phase,
+    _memory_profile,
+    w_to_csr,
+    removable_areas,
+    BLOCK_SIZE,
 )
 
+# approximate bytes per neighbor link of the CSR adjacency and per area of
+# the remaining working set, measured with tracemalloc and used by
+# RegionKMeansHeuristic.estimate_memory
+GRAPH_NBYTES = 16
+WORKING_NBYTES = 160
 
-def region_k_means(X, n_clusters, w):
+
+MOVES = ["all", "independent"]
+
+
+def region_k_means(
+    X, n_clusters, w, counters=None, timings=None, callback=None, moves="all"
+):
     """Solve the region-K-means problem, the K-means with the constraint
     that each cluster forms a spatially connected component.
 
@@ -29,6 +42,33 @@ def region_k_means(X, n_clusters, w):
     w : libpysal.weights.W
         ...
 
+    counters : collections.Counter
+        Accumulates the ``'_closest_calls'`` and ``'ok_moves_calls'``, the
+        number of ``'reassignment_moves'`` and, with ``moves='independent'``,
+        of the ``'deferred_moves'`` checked again. Default is ``None``.
+
+    timings : collections.Counter
+        Accumulates the wall-clock seconds of the ``'growth'`` and
+        ``'reassignment'`` phases. Default is ``None``.
+
+    callback : callable
+        Called as ``callback(event, info)`` to report progress, with the
+        event name and a dict. Phases send ``'phase_start'`` and
+        ``'phase_end'`` with the ``'phase'`` name and its ``'seconds'``,
+        every reassignment iteration an ``'iteration'`` with its index
+        ``'iteration'`` and the number of ``'candidates'`` moved.
+        Default is ``None``.
+
+    moves : str
+        How the valid moves of a reassignment iteration are applied.
+        ``'all'`` applies every move that is valid on its own at once, and
+        two moves can then disconnect a region together. ``'independent'``
+        applies them in rounds, each a maximal set of moves that cannot
+        disconnect a region together, see ``_independent``, and checks the
+        deferred moves again against the updated regions before the next
+        round, so every region stays connected.
+        Default is ``'all'``.
+
     Returns
     -------
 
@@ -45,79 +85,246 @@ def region_k_means(X, n_clusters, w):
 
     """
 
-    data = X
-    a_list = w.to_adjlist(remove_symmetric=False)
+    if moves not in MOVES:
+        raise ValueError(
+            "Unknown moves '%s'. Choose one of %s."
+            % (moves, ", ".join("'%s'" % m for m in MOVES))
+        )
+    if counters is None:
+        counters = Counter()
+    data = numpy.asarray(X)
     areas = numpy.arange(w.n).astype(int)
     k = n_clusters
     seeds = _seeds(areas, k)
 
     # initial assignment phase
-    label = numpy.array([-1] * w.n).astype(int)
-    for i, seed in enumerate(seeds):
-        label[seed] = i
-    to_assign = areas[label == -1]
-    c = 0
-    while to_assign.size > 0:
-        assignments = defaultdict(list)
-        for rid in range(k):
-            region = areas[label == rid]
-            neighbors = region_neighbors(a_list, region)
-            neighbors = [j for j in neighbors if j in to_assign]
-            if neighbors:
-                d_min = numpy.inf
-                centroid = data[region].mean(axis=0)
-                for neighbor in neighbors:
-                    d = ((data[neighbor] - centroid) ** 2).sum()
-                    if d < d_min:
-                        idx = neighbor
-                        d_min = d
-                assignments[idx].append([rid, d_min])
-        for key in assignments:
-            assignment = assignments[key]
-            if len(assignment) == 1:
-                r, d = assignment[0]
-                label[key] = r
-            else:
-                d_min = numpy.inf
-                for match in assignment:
-                    r, d = match
-                    if d < d_min:
-                        idx = r
-                        d_min = d
-                label[key] = idx
-
-        to_assign = areas[label == -1]
+    with _phase("growth", timings, callback):
+        adjacency = w_to_csr(w)
+        label = _grow(data, seeds, adjacency)
 
     # reassignment phase
-    changed = []
-    g = w_to_g(w)
-
-    iters = 1
-
-    # want to loop this until candidates is empty
-    regions = [areas[label == r].tolist() for r in range(k)]
-    centroid = _centroid(regions, data)
-    closest = numpy.array(_closest(data, centroid))
-    candidates = areas[closest != label]
-    candidates = ok_moves(candidates, regions, label, closest, g, w, areas)
-    while candidates:
-        # make moves
-        for area in candidates:
-            label[area] = closest[area]
-        regions = [areas[label == r].tolist() for r in range(k)]
-        centroid = _centroid(regions, data)
-        closest = numpy.array(_closest(data, centroid))
+    with _phase("reassignment", timings, callback):
+        iters = 1
+
+        # members, attribute sums and sizes of the regions, updated by the
+        # moved areas only
+        regions = [set() for r in range(k)]
+        for area, r in enumerate(label.tolist()):
+            regions[r].add(area)
+        sums = numpy.zeros((k, data.shape[1]))
+        numpy.add.at(sums, label, data)
+        counts = numpy.bincount(label, minlength=k)
+        centroid = _centroids(sums, counts)
+        counters["_closest_calls"] += 1
+        closest = _closest(data, centroid)
         candidates = areas[closest != label]
-        candidates = ok_moves(candidates, regions, label, closest, g, w, areas)
-        iters += 1
+        counters["ok_moves_calls"] += 1
+        candidates = ok_moves(
+            candidates, regions, label, closest, None, w, areas, adjacency=adjacency
+        )
+        while candidates:
+            n_moved = 0
+            while candidates:
+                if moves == "all":
+                    batch, candidates = candidates, []
+                else:
+                    batch, candidates = _independent(
+                        candidates, label, closest, regions, adjacency
+                    )
+                n_moved += len(batch)
+                # make moves
+                moved = numpy.asarray(batch)
+                source = label[moved]
+                destination = closest[moved]
+                numpy.subtract.at(sums, source, data[moved])
+                numpy.add.at(sums, destination, data[moved])
+                counts -= numpy.bincount(source, minlength=k)
+                counts += numpy.bincount(destination, minlength=k)
+                for area, r, s in zip(batch, source.tolist(), destination.tolist()):
+                    regions[r].discard(area)
+                    regions[s].add(area)
+                label[moved] = destination
+                if candidates:
+                    counters["deferred_moves"] += len(candidates)
+                    counters["ok_moves_calls"] += 1
+                    candidates = ok_moves(
+                        candidates,
+                        regions,
+                        label,
+                        closest,
+                        None,
+                        w,
+                        areas,
+                        adjacency=adjacency,
+                    )
+            if callback is not None:
+                callback("iteration", {"iteration": iters, "candidates": n_moved})
+            counters["reassignment_moves"] += n_moved
+            centroid = _centroids(sums, counts)
+            counters["_closest_calls"] += 1
+            closest = _closest(data, centroid)
+            candidates = areas[closest != label]
+            counters["ok_moves_calls"] += 1
+            candidates = ok_moves(
+                candidates, regions, label, closest, None, w, areas, adjacency=adjacency
+            )
+            iters += 1
 
     return centroid, label, iters
 
 
+def _centroids(sums, counts):
+    """Means of the regions from their attribute ``sums`` and sizes
+    ``counts``, NaN for an empty region, which ``_closest`` skips.
+
+    """
+
+    centroids = numpy.full(sums.shape, numpy.nan)
+    nonempty = counts > 0
+    centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+def _independent(candidates, label, closest, regions, adjacency):
+    """Split valid moves into a batch that can be applied at once and the
+    deferred rest.
+
+    A move takes an area from its region to its closest region. Moves are
+    taken greedily in order unless their source is the destination of an
+    earlier move of the batch, or their destination is the source of one.
+    A source gives up several areas as long as each one is still removable
+    from the members it has left, and a destination only gains areas next
+    to its unchanged members, so all regions stay connected.
+
+    Parameters
+    ----------
+
+    candidates : list
+        Areas whose moves are valid on their own.
+
+    label : numpy.ndarray
+        Region of every area.
+
+    closest : numpy.ndarray
+        Destination region of every area.
+
+    regions : list
+        Members of every region, indexed by label.
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency of the areas from ``w_to_csr``.
+
+    Returns
+    -------
+
+    batch : list
+        Areas to move now.
+
+    deferred : list
+        Areas whose moves conflict with the batch.
+
+    """
+
+    batch = []
+    deferred = []
+    # members left to the sources of the batch
+    left = {}
+    destinations = set()
+    for area in candidates:
+        source, destination = label[area], closest[area]
+        if source in destinations or destination in left:
+            deferred.append(area)
+            continue
+        if source in left:
+            # the first area ``ok_moves`` checked, the others against the
+            # members the source has left
+            members = numpy.fromiter(left[source], dtype=int)
+            if not removable_areas(adjacency, members)[members == area].any():
+                deferred.append(area)
+                continue
+        else:
+            left[source] = set(regions[source])
+        batch.append(area)
+        left[source].discard(area)
+        destinations.add(destination)
+    return batch, deferred
+
+
+def _grow(data, seeds, adjacency):
+    """Grow one region from each seed until every area is assigned.
+
+    In every pass each region picks the unassigned neighboring area closest
+    to its centroid, ties going to the lowest area index, and an area picked
+    by several regions joins the closest one, ties going to the lowest
+    region. Regions keep the set of their unassigned neighbors, the frontier,
+    and the running sums of their members, so a pass costs time in the size
+    of the frontiers only.
+
+    Parameters
+    ----------
+
+    data : numpy.ndarray
+        The observations shaped ``(n_samples, n_features)``.
+
+    seeds : numpy.ndarray
+        The first area of every region.
+
+    adjacency : scipy.sparse.csr_matrix
+        Adjacency matrix of the areas, e.g. from ``w_to_csr``.
+
+    Returns
+    -------
+
+    label : numpy.ndarray
+        Region of every area.
+
+    """
+
+    indptr, indices = adjacency.indptr, adjacency.indices
+    label = numpy.full(adjacency.shape[0], -1, dtype=int)
+    sums = numpy.zeros((len(seeds), data.shape[1]))
+    counts = numpy.zeros(len(seeds), dtype=int)
+    frontiers = [set() for _ in seeds]
+    assignments = {area: rid for rid, area in enumerate(seeds.tolist())}
+    while assignments:
+        for area, rid in assignments.items():
+            label[area] = rid
+            sums[rid] += data[area]
+            counts[rid] += 1
+        # only after the whole pass, areas assigned together are not frontier
+        for area, rid in assignments.items():
+            for neighbor in indices[indptr[area] : indptr[area + 1]].tolist():
+                other = label[neighbor]
+                if other == -1:
+                    frontiers[rid].add(neighbor)
+                else:
+                    frontiers[other].discard(area)
+        best = {}
+        for rid, frontier in enumerate(frontiers):
+            if not frontier:
+                continue
+            candidates = numpy.array(sorted(frontier))
+            centroid = sums[rid] / counts[rid]
+            d = ((data[candidates] - centroid) ** 2).sum(axis=1)
+            i = d.argmin()
+            area = candidates[i]
+            if area not in best or d[i] < best[area][1]:
+                best[area] = rid, d[i]
+        assignments = {area: rid for area, (rid, _) in best.items()}
+    if (label == -1).any():
+        raise ValueError(
+            "%d areas are not connected to any seed, every connected "
+            "component of w needs a region." % (label == -1).sum()
+        )
+    return label
+
+
 class RegionKMeansHeuristic(BaseSpOptHeuristicSolver):
     """...Needs a short description..."""
     
-    def __init__(self, data, k, w):
+    def __init__(
+        self, data, k, w, callback=None, profile_memory=False, moves="all"
+    ):
         """
         
         Parameters
@@ -132,6 +339,19 @@ class RegionKMeansHeuristic(BaseSpOptHeuristicSolver):
         w : 
             ...
         
+        callback : callable
+            Called as ``callback(event, info)`` with the progress events of
+            ``region_k_means``. Default is ``None``.
+        
+        profile_memory : bool
+            Trace the memory of every phase of ``solve`` with
+            ``tracemalloc`` into ``memory_``. Default is ``False``.
+        
+        moves : str
+            ``'all'`` or ``'independent'``, how the moves of a reassignment
+            iteration are applied, see ``region_k_means``.
+            Default is ``'all'``.
+        
         Attributes
         ----------
         
@@ -144,14 +364,87 @@ class RegionKMeansHeuristic(BaseSpOptHeuristicSolver):
         iters_ : 
             ...
         
+        counters_ : collections.Counter
+            Calls of the hot helpers and number of reassignment moves.
+        
+        timings_ : collections.Counter
+            Wall-clock seconds of each phase and of the whole ``'solve'``.
+        
+        memory_ : dict
+            With ``profile_memory``, the ``'peak'`` bytes allocated during
+            each phase and the bytes it ``'retained'``, keyed by the phases
+            of ``timings_``.
+        
         """
         self.data = data
         self.w = w
         self.k = k
+        self.callback = callback
+        self.profile_memory = profile_memory
+        self.moves = moves
 
     def solve(self):
         """Solve the region k-means heuristic."""
-        centroid, label, iters = region_k_means(self.data, self.k, self.w)
+        counters = Counter()
+        timings = Counter()
+        memory = {} if self.profile_memory else None
+        with _memory_profile(self.callback, memory) as callback:
+            with _phase("solve", timings, callback):
+                centroid, label, iters = region_k_means(
+                    self.data,
+                    self.k,
+                    self.w,
+                    counters=counters,
+                    timings=timings,
+                    callback=callback,
+                    moves=self.moves,
+                )
         self.labels_ = label
         self.centroids_ = centroid
         self.iters_ = iters
+        self.counters_ = counters
+        self.timings_ = timings
+        if memory is not None:
+            self.memory_ = memory
+
+    @classmethod
+    def estimate_memory(cls, n, n_features, k, n_neighbors=6):
+        """Predict the memory ``solve`` needs before running it.
+
+        The estimate covers the arrays of the solver, not the input data
+        and weights.
+
+        Parameters
+        ----------
+
+        n : int
+            The number of areas.
+
+        n_features : int
+            The number of attributes.
+
+        k : int
+            The number of regions.
+
+        n_neighbors : float
+            Average number of neighbors of an area. Default is ``6``.
+
+        Returns
+        -------
+
+        estimate : dict
+            Bytes of the CSR adjacency ``'graph'``, the blocks of area to
+            centroid ``'distances'``, the ``'centroids'``, the remaining
+            ``'working'`` set and the expected ``'peak'`` of ``solve``.
+
+        """
+
+        estimate = {
+            "graph": GRAPH_NBYTES * int(n * n_neighbors),
+            # the block of products and the distances computed from it
+            "distances": 16 * min(n, max(1, BLOCK_SIZE // k)) * k,
+            "centroids": 8 * k * n_features,
+            "working": WORKING_NBYTES * n,
+        }
+        estimate["peak"] = sum(estimate.values())
+        return estimate
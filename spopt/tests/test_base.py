@@ -0,0 +1,125 @@
+import numpy
+import libpysal
+import networkx
+
+from ..region.base import (
+    w_to_g,
+    w_to_csr,
+    articulation_points,
+    removable_areas,
+    dissimilarity_engine,
+    DenseDissimilarity,
+    CondensedDissimilarity,
+    OnDemandDissimilarity,
+    _closest,
+    ok_moves,
+    move_ok,
+    is_neighbor,
+    _region_adjacency,
+)
+
+
+def test_dissimilarity_engines():
+    numpy.random.seed(12345)
+    attr = numpy.random.normal(size=(20, 3))
+    members = numpy.array([3, 7, 8, 15, 19])
+    dense = dissimilarity_engine(attr, "dense")
+    assert isinstance(dense, DenseDissimilarity)
+    for kind in ["condensed", "ondemand"]:
+        engine = dissimilarity_engine(attr, kind)
+        numpy.testing.assert_allclose(
+            engine.block(members, numpy.arange(20)),
+            dense.block(members, numpy.arange(20)),
+        )
+        numpy.testing.assert_allclose(engine.row(7, members), dense.row(7, members))
+        numpy.testing.assert_allclose(
+            engine.within_sum(members), dense.within_sum(members)
+        )
+    assert isinstance(dissimilarity_engine(attr), DenseDissimilarity)
+
+
+def test_dissimilarity_update():
+    numpy.random.seed(12345)
+    attr = numpy.random.normal(size=(20, 3))
+    rows = numpy.array([2, 11])
+    new = numpy.random.normal(size=(2, 3))
+    changed = attr.copy()
+    changed[rows] = new
+    expected = dissimilarity_engine(changed, "dense").matrix
+    for kind in ["dense", "condensed", "ondemand"]:
+        engine = dissimilarity_engine(attr, kind)
+        engine.update(rows, new)
+        numpy.testing.assert_allclose(
+            engine.block(numpy.arange(20), numpy.arange(20)), expected
+        )
+
+
+def test_removable_areas():
+    w = libpysal.weights.lat2W(4, 4)
+    adjacency = w_to_csr(w)
+    g = w_to_g(w)
+    for members in [
+        [0, 1, 2, 3, 7, 11, 10, 9],
+        [0, 1, 5, 9, 10, 6, 2],
+        [0, 1, 2, 15],
+        [5],
+        list(range(16)),
+    ]:
+        expected = [
+            len(members) > 1
+            and networkx.is_connected(g.subgraph([m for m in members if m != a]))
+            for a in members
+        ]
+        numpy.testing.assert_array_equal(removable_areas(adjacency, members), expected)
+    cuts = articulation_points(adjacency, [0, 1, 2, 6, 10, 9, 8])
+    numpy.testing.assert_array_equal(cuts, [1, 2, 6, 10, 9])
+
+
+def test_ok_moves():
+    w = libpysal.weights.lat2W(6, 6)
+    adjacency = w_to_csr(w)
+    g = w_to_g(w)
+    areas = numpy.arange(w.n)
+    labels = numpy.repeat([0, 1, 2], 12)
+    labels[[14, 15, 20]] = 0
+    regions = [areas[labels == r].tolist() for r in range(3)]
+    closest = (labels + 1) % 3
+    candidates = areas[closest != labels]
+    expected = [
+        area
+        for area in candidates
+        if any(labels[j] == closest[area] for j in w.neighbors[area])
+        and networkx.is_connected(
+            g.subgraph([j for j in regions[labels[area]] if j != area])
+        )
+    ]
+    keep = ok_moves(
+        candidates, regions, labels, closest, g, w, areas, adjacency=adjacency
+    )
+    assert keep == expected
+    assert ok_moves(candidates, regions, labels, closest, g, w, areas) == expected
+    for area in candidates:
+        source, destination = regions[labels[area]], regions[closest[area]]
+        assert move_ok(area, source, destination, g, w) == (area in expected)
+    assert is_neighbor(0, regions[1], w, adjacency=adjacency) is False
+    # without ``adjacency`` only the subgraph of the source region is built
+    members = regions[0]
+    local = _region_adjacency(w, members)
+    assert (local != adjacency[members][:, members]).nnz == 0
+    assert is_neighbor(8, regions[0], w) is True
+
+
+def test_closest():
+    numpy.random.seed(12345)
+    data = numpy.random.normal(size=(500, 3)) + 1000
+    centroids = data[:7]
+    expected = [numpy.argmin(((row - centroids) ** 2).sum(axis=1)) for row in data]
+    for block_size in [7, 50, 2 ** 20]:
+        closest = _closest(data, centroids, block_size=block_size)
+        numpy.testing.assert_array_equal(closest, expected)
+    closest = _closest(data, centroids, dtype=numpy.float32)
+    assert (closest != expected).mean() < 0.01
+    # a NaN centroid, e.g. of an empty region, is skipped
+    centroids = numpy.vstack([numpy.full(3, numpy.nan), centroids])
+    closest = _closest(data, centroids)
+    numpy.testing.assert_array_equal(closest, numpy.array(expected) + 1)
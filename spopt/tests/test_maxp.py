@@ -1,20 +1,46 @@
 import numpy
 import libpysal
+from collections import Counter
 import geopandas as gpd
+import pandas
 import os
 import sys
+import pytest
 
 # sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
 from .. import MaxPHeuristic
+from ..region.base import dissimilarity_engine, w_to_csr, label_components
+from ..region.maxp import (
+    Partition,
+    assignEnclave,
+    construction_phase,
+    growClusterForPoly,
+    performSA,
+    calculateWithinRegionDistance,
+    p_upper_bound,
+    repair_partition,
+    maxp,
+)
 
 
-def test_MaxPHeuristic():
+@pytest.fixture
+def mexico_example():
+    """The Mexico example with a ``count`` of one per area, its queen
+    contiguity weights and the names of its GDP columns.
+
+    """
 
     pth = libpysal.examples.get_path("mexicojoin.shp")
     mexico = gpd.read_file(pth)
     mexico["count"] = 1
     w = libpysal.weights.Queen.from_dataframe(mexico)
     attrs_name = [f"PCGDP{year}" for year in range(1950, 2010, 10)]
+    return mexico, w, attrs_name
+
+
+def test_MaxPHeuristic(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
     threshold = 4
     top_n = 2
     threshold_name = "count"
@@ -22,37 +48,453 @@ def test_MaxPHeuristic():
     model = MaxPHeuristic(mexico, w, attrs_name, threshold_name, threshold, top_n)
     model.solve()
     labels = [
-        5,
+        8,
+        8,
         5,
         3,
-        6,
-        6,
-        6,
+        7,
+        3,
         1,
+        4,
+        3,
         1,
         1,
+        3,
         1,
-        8,
         6,
-        8,
+        6,
+        4,
+        6,
+        4,
         2,
         2,
-        8,
+        6,
         2,
         8,
-        7,
-        7,
-        2,
-        7,
         5,
-        3,
-        3,
         5,
-        3,
+        8,
+        5,
+        7,
         4,
+        7,
+        7,
+        2,
+    ]
+    assert numpy.array_equal(model.labels_, labels)
+
+
+def test_MaxPHeuristic_dissimilarity(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    results = []
+    for dissimilarity in ["dense", "condensed", "ondemand"]:
+        numpy.random.seed(123456)
+        model = MaxPHeuristic(
+            mexico, w, attrs_name, "count", 4, 2, dissimilarity=dissimilarity
+        )
+        model.solve()
+        results.append(model.labels_)
+    numpy.testing.assert_array_equal(results[0], results[1])
+    numpy.testing.assert_array_equal(results[0], results[2])
+
+
+def test_performSA_objective(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    attr = mexico[attrs_name].values
+    threshold_array = mexico["count"].values
+    distance_matrix = dissimilarity_engine(attr)
+    numpy.random.seed(123456)
+    max_p, rl_list = construction_phase(
+        numpy.arange(w.n), attr, threshold_array, distance_matrix, w, 4, 2, 10
+    )
+    counters = Counter()
+    partition, objective = performSA(
+        rl_list[0],
+        threshold_array,
+        w,
+        distance_matrix,
         4,
+        0.998,
+        10,
+        w.n,
+        counters=counters,
+    )
+    expected = calculateWithinRegionDistance(partition, distance_matrix)
+    numpy.testing.assert_allclose(objective, expected)
+    assert partition.p == max_p
+    assert counters["movable_area_cache_misses"] >= max_p
+    assert counters["movable_area_cache_hits"] > 0
+
+
+def test_MaxPHeuristic_n_jobs(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    results = []
+    for n_jobs in [1, 2]:
+        model = MaxPHeuristic(
+            mexico, w, attrs_name, "count", 4, 2, n_jobs=n_jobs, seed=12345
+        )
+        model.solve()
+        results.append(model.labels_)
+    numpy.testing.assert_array_equal(results[0], results[1])
+
+
+def test_MaxPHeuristic_sa_backend(mexico_example):
+
+    pytest.importorskip("numba")
+    mexico, w, attrs_name = mexico_example
+    models = []
+    for sa_backend in ["python", "numba"]:
+        for dissimilarity in ["dense", "condensed"]:
+            # update changes the attributes in place
+            model = MaxPHeuristic(
+                mexico.copy(),
+                w,
+                attrs_name,
+                "count",
+                4,
+                2,
+                9,
+                dissimilarity=dissimilarity,
+                seed=12345,
+                sa_backend=sa_backend,
+            )
+            model.solve()
+            model.update(mexico.loc[[3], attrs_name] * 2)
+            models.append(model)
+    for model in models[1:]:
+        numpy.testing.assert_array_equal(model.labels_, models[0].labels_)
+        for key in ["checkMove_calls", "sa_moves_accepted", "sa_moves_rejected"]:
+            assert model.counters_[key] == models[0].counters_[key]
+
+
+def test_MaxPHeuristic_sa_backend_fallback(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    model = MaxPHeuristic(
+        mexico,
+        w,
+        attrs_name,
+        "count",
         4,
+        2,
+        9,
+        dissimilarity="ondemand",
+        seed=12345,
+        sa_backend="numba",
+    )
+    with pytest.warns(UserWarning, match="sa_backend"):
+        model.solve()
+    model.sa_backend = "cuda"
+    with pytest.raises(ValueError):
+        model.solve()
+
+
+def test_MaxPHeuristic_target_objective(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    first = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, 1, max_iterations_sa=1, seed=12345
+    )
+    first.solve()
+    stopped = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, 1, seed=12345, target_objective=numpy.inf
+    )
+    stopped.solve()
+    numpy.testing.assert_array_equal(first.labels_, stopped.labels_)
+
+
+def test_MaxPHeuristic_time_limit(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    model = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, seed=12345, time_limit=0
+    )
+    model.solve()
+    assert model.counters_["construction_trials"] == 1
+    assert model.counters_["time_limit_reached"] == 1
+    assert len(model.labels_) == len(mexico)
+    assert (model.labels_ > 0).all()
+    assert len(set(model.labels_)) == model.p
+
+
+def test_MaxPHeuristic_callback(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    events = []
+    model = MaxPHeuristic(
+        mexico,
+        w,
+        attrs_name,
+        "count",
         4,
-        7,
-    ]
-    numpy.array_equal(model.labels_, labels)
+        2,
+        9,
+        2,
+        seed=12345,
+        callback=lambda event, info: events.append((event, info)),
+    )
+    model.solve()
+    names = Counter(event for event, _ in events)
+    assert names["construction_trial"] == model.counters_["construction_trials"]
+    assert names["sa_run"] == model.counters_["sa_restarts"]
+    assert 0 < names["sa_iteration"] <= model.counters_["checkMove_calls"]
+    assert names["sa_iteration"] == (
+        model.counters_["sa_moves_accepted"] + model.counters_["sa_moves_rejected"]
+    )
+    phases = [info["phase"] for event, info in events if event == "phase_end"]
+    assert phases == ["dissimilarity", "construction", "sa", "solve"]
+    assert set(model.timings_) == set(phases)
+    assert model.timings_["solve"] >= model.timings_["sa"] > 0
+
+
+def test_MaxPHeuristic_profile_memory():
+
+    w = libpysal.weights.lat2W(20, 20)
+    numpy.random.seed(12345)
+    data = pandas.DataFrame(numpy.random.random((w.n, 3)), columns=["a", "b", "c"])
+    data["count"] = 1
+    model = MaxPHeuristic(
+        data, w, ["a", "b", "c"], "count", 10, 2, 20, 1, seed=1, profile_memory=True
+    )
+    model.solve()
+    assert set(model.memory_) == set(model.timings_)
+    assert model.memory_["dissimilarity"]["retained"] >= 8 * w.n ** 2
+    estimate = MaxPHeuristic.estimate_memory(
+        w.n, 3, max_iterations_construction=20, n_neighbors=4
+    )
+    assert estimate["dissimilarity"] == 8 * w.n * (w.n + 3)
+    assert 0.5 < estimate["peak"] / model.memory_["solve"]["peak"] < 2
+    parallel = MaxPHeuristic.estimate_memory(w.n, 3, n_jobs=2)
+    assert parallel["workers"] == parallel["dissimilarity"] + parallel["adjacency"]
+
+
+def test_MaxPHeuristic_max_p_bound(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    assert p_upper_bound(mexico["count"].values, 4) == 8
+    model = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, 99, seed=12345, max_p_bound="auto"
+    )
+    model.solve()
+    assert model.p == 8
+    assert model.counters_["construction_trials"] < 99
+
+
+def test_MaxPHeuristic_initial_labels(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    first = MaxPHeuristic(mexico, w, attrs_name, "count", 4, 2, 9, seed=12345)
+    first.solve()
+    warm = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, seed=1, initial_labels=first.labels_
+    )
+    warm.solve()
+    assert warm.p == first.p
+    assert warm.counters_["construction_trials"] == 0
+    assert warm.counters_["warm_start_repairs"] == 0
+    # no singleton meets the threshold, the warm start is thrown away
+    cold = MaxPHeuristic(
+        mexico, w, attrs_name, "count", 4, 2, 9, seed=1, initial_labels=range(32)
+    )
+    with pytest.warns(UserWarning, match="construction phase"):
+        cold.solve()
+    assert cold.counters_["construction_trials"] == 9
+    assert cold.counters_["warm_start_repairs"] == 0
+
+
+def test_MaxPHeuristic_update(mexico_example):
+
+    mexico, w, attrs_name = mexico_example
+    model = MaxPHeuristic(mexico, w, attrs_name, "count", 4, 2, 9, seed=12345)
+    model.solve()
+    before = model.labels_.copy()
+    changed = mexico.loc[[3], attrs_name] * 2
+    model.update(changed)
+    numpy.testing.assert_array_equal(model.gdf.loc[3, attrs_name], changed.loc[3])
+    expected = dissimilarity_engine(mexico[attrs_name].values).matrix
+    numpy.testing.assert_allclose(model._dissimilarity.matrix, expected)
+    # only the region of area 3 and its neighboring regions can change
+    region = before[3]
+    members = numpy.flatnonzero(before == region)
+    neighbors = {j for i in members for j in w.neighbors[i]}
+    active = {region} | {before[j] for j in neighbors}
+    untouched = ~numpy.isin(before, list(active))
+    numpy.testing.assert_array_equal(model.labels_[untouched], before[untouched])
+    assert model.p == len(set(model.labels_))
+
+
+def test_maxp_multilevel():
+
+    w = libpysal.weights.lat2W(20, 20)
+    numpy.random.seed(12345)
+    data = pandas.DataFrame(
+        {"a": numpy.random.randint(0, 50, w.n), "t": numpy.random.randint(1, 5, w.n)}
+    )
+    counters = Counter()
+    p, labels = maxp(
+        data, w, ["a"], "t", 30, 2, 9, 1, seed=1, multilevel=2, counters=counters
+    )
+    assert counters["multilevel_levels"] == 2
+    assert p == len(numpy.unique(labels))
+    totals = numpy.bincount(labels, weights=data["t"])[1:]
+    assert (totals >= 30).all()
+    # regions are contiguous
+    assert len(numpy.unique(label_components(w_to_csr(w), labels))) == p
+
+
+def test_maxp_blocks():
+
+    lattice = libpysal.weights.lat2W(6, 6)
+    neighbors = dict(lattice.neighbors)
+    neighbors.update(
+        {i + 36: [j + 36 for j in lattice.neighbors[i]] for i in range(36)}
+    )
+    # two disconnected lattices and an island too small for a region
+    neighbors[72] = []
+    w = libpysal.weights.W(neighbors, silence_warnings=True)
+    numpy.random.seed(12345)
+    data = pandas.DataFrame(
+        {"a": numpy.random.randint(0, 50, w.n), "t": numpy.random.randint(1, 5, w.n)}
+    )
+    data.loc[72, "t"] = 1
+    data["half"] = numpy.arange(w.n) % 6 < 3
+    for blocks in ["components", "half"]:
+        counters = Counter()
+        p, labels = maxp(
+            data, w, ["a"], "t", 10, 2, 9, 1, seed=1, blocks=blocks, counters=counters
+        )
+        assert counters["blocks"] == (3 if blocks == "components" else 5)
+        assert p == len(numpy.unique(labels[labels > 0]))
+        assert labels[72] == -1
+        assert (numpy.bincount(labels[:72], weights=data["t"][:72])[1:] >= 10).all()
+        for region in range(1, p + 1):
+            members = numpy.flatnonzero(labels == region)
+            assert len(numpy.unique(members >= 36)) == 1
+            if blocks == "half":
+                assert len(data["half"][members].unique()) == 1
+        parallel = maxp(
+            data, w, ["a"], "t", 10, 2, 9, 1, seed=1, blocks=blocks, n_jobs=2
+        )
+        numpy.testing.assert_array_equal(parallel[1], labels)
+    # every block stops after its first annealing once it meets its share
+    counters = Counter()
+    maxp(
+        data, w, ["a"], "t", 10, 2, 9, 5, seed=1, target_objective=numpy.inf,
+        counters=counters,
+    )
+    assert counters["sa_restarts"] == 2
+    with pytest.raises(ValueError, match="max_p_bound"):
+        maxp(data, w, ["a"], "t", 10, 2, 9, 1, max_p_bound=5)
+    # the coarse solve of the multilevel mode keeps blocks=None
+    counters = Counter()
+    maxp(
+        data, w, ["a"], "t", 10, 2, 9, 1, seed=1, blocks=None, multilevel=1,
+        counters=counters,
+    )
+    assert counters["multilevel_levels"] == 1
+    assert counters["blocks"] == 0
+    args = (data.copy(), w, ["a"], "t", 10, 2, 9, 1)
+    whole = MaxPHeuristic(*args, blocks=None, profile_memory=True)
+    whole.solve()
+    model = MaxPHeuristic(*args, blocks="half", profile_memory=True)
+    model.solve()
+    # the blocks build their own dissimilarities, not the whole engine
+    assert model._dissimilarity is None
+    assert model.memory_["dissimilarity"]["retained"] < (
+        whole.memory_["dissimilarity"]["retained"]
+    )
+    changed = data.loc[[0, 4, 14, 15], ["a", "t"]]
+    changed["a"] = [49, 0, 49, 0]
+    changed["t"] = 1
+    model.update(changed)
+    # the update keeps the regions within their blocks and only builds the
+    # dissimilarities of the changed blocks
+    assert model._dissimilarity is None
+    assert sorted(model._block_engines) == sorted(set(model._pieces[changed.index]))
+    labels = model.labels_
+    for region in numpy.unique(labels[labels > 0]):
+        assert len(set(model._pieces[labels == region])) == 1
+
+
+def test_construction_phase_pool_size():
+
+    w = libpysal.weights.lat2W(4, 4)
+    attr = numpy.arange(w.n, dtype=float).reshape(-1, 1)
+    threshold_array = numpy.ones(w.n)
+    args = (numpy.arange(w.n), attr, threshold_array, dissimilarity_engine(attr))
+    counters = Counter()
+    p, pool = construction_phase(*args, w, 4, 1, 60, seed=3, counters=counters)
+    digests = {partition.digest() for partition in pool}
+    assert len(digests) == len(pool)
+    assert counters["duplicate_partitions"] > 0
+    bounded_p, bounded = construction_phase(*args, w, 4, 1, 60, seed=3, pool_size=2)
+    assert bounded_p == p
+    assert len(bounded) == min(2, len(pool))
+    for a, b in zip(bounded, pool):
+        numpy.testing.assert_array_equal(a.labels, b.labels)
+
+
+def test_repair_partition():
+
+    w = libpysal.weights.lat2W(3, 3)
+    threshold_array = numpy.ones(9)
+    attr = numpy.arange(9.0).reshape(-1, 1)
+    # region 1 is split in two, region 3 is below the threshold
+    labels = numpy.array([1, 1, 2, 2, 2, 2, 1, 3, -1])
+    partition, repaired = repair_partition(
+        labels, threshold_array, 2, dissimilarity_engine(attr), w, rng=0
+    )
+    assert repaired == 3
+    assert partition.p == 2
+    assert (partition.spatial[partition.regions()] >= 2).all()
+    numpy.testing.assert_array_equal(partition.labels, [1, 1, 2, 2, 2, 2, 2, 2, 2])
+
+
+def test_Partition():
+
+    threshold_array = numpy.array([1, 2, 3, 4, 5, 6])
+    partition = Partition.from_labels([1, 2, 1, 2, 1, 0], threshold_array)
+    assert partition.p == 2
+    numpy.testing.assert_array_equal(partition.members(1), [0, 2, 4])
+    copy = partition.copy()
+    partition.move(2, 2)
+    partition.assign(5, 1)
+    numpy.testing.assert_array_equal(partition.members(1), [0, 4, 5])
+    numpy.testing.assert_array_equal(partition.members(2), [1, 3, 2])
+    numpy.testing.assert_array_equal(partition.spatial[1:3], [12, 9])
+    numpy.testing.assert_array_equal(copy.members(1), [0, 2, 4])
+    numpy.testing.assert_array_equal(copy.labels, [1, 2, 1, 2, 1, 0])
+    relabelled = Partition.from_labels([2, 1, 2, 1, 2, 0], threshold_array)
+    assert relabelled.digest() == copy.digest()
+    assert partition.digest() != copy.digest()
+
+
+def test_growClusterForPoly():
+
+    w = libpysal.weights.lat2W(5, 5)
+    labels = [0] * w.n
+    labels[13] = -1
+    queued = bytearray(w.n)
+    labeledID, total = growClusterForPoly(
+        labels, [1] * w.n, 12, 1, w_to_csr(w), 6, queued=queued
+    )
+    assert labeledID == [12, 7, 11, 17, 2, 6]
+    assert total == 6
+    assert not any(queued)
+
+
+def test_assignEnclave():
+
+    neighbors = {0: [1], 1: [0, 2], 2: [1, 3], 3: [2], 4: [5], 5: [4]}
+    w = libpysal.weights.W(neighbors)
+    attr = numpy.arange(6).reshape(-1, 1)
+    threshold_array = numpy.ones(6)
+    partition = Partition.from_labels([1, -1, -1, -1, -1, -1], threshold_array)
+    partition = assignEnclave(
+        [5, 3, 4, 2, 1], partition, threshold_array, w, dissimilarity_engine(attr)
+    )
+    numpy.testing.assert_array_equal(partition.members(1), [0, 1, 2, 3])
+    numpy.testing.assert_array_equal(partition.labels, [1, 1, 1, 1, -1, -1])
@@ -2,9 +2,12 @@ import numpy
 import libpysal
 import os
 import sys
+import pytest
 
 # sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
 from .. import RegionKMeansHeuristic
+from ..region.base import label_components, w_to_csr
+from ..region.region_k_means import _grow, _independent
 
 
 def test_RegionKMeansHeuristic():
@@ -15,3 +18,93 @@ def test_RegionKMeansHeuristic():
     model = RKM(data, 3, w)
     model.solve()
     numpy.array_equal(model.labels_, numpy.array([1, 2, 2, 1, 2, 0, 1, 1, 0]))
+
+
+def test_RegionKMeansHeuristic_callback():
+    numpy.random.seed(12345)
+    w = libpysal.weights.lat2W(5, 5)
+    data = numpy.random.normal(size=(w.n, 3))
+    events = []
+    model = RegionKMeansHeuristic(
+        data, 3, w, callback=lambda event, info: events.append((event, info))
+    )
+    model.solve()
+    iterations = [info for event, info in events if event == "iteration"]
+    assert len(iterations) == model.iters_ - 1
+    assert model.counters_["_closest_calls"] == model.iters_
+    assert model.counters_["reassignment_moves"] == sum(
+        info["candidates"] for info in iterations
+    )
+    assert set(model.timings_) == {"growth", "reassignment", "solve"}
+
+
+def test_RegionKMeansHeuristic_profile_memory():
+    numpy.random.seed(12345)
+    w = libpysal.weights.lat2W(5, 5)
+    data = numpy.random.normal(size=(w.n, 3))
+    model = RegionKMeansHeuristic(data, 3, w, profile_memory=True)
+    model.solve()
+    assert set(model.memory_) == {"growth", "reassignment", "solve"}
+    assert model.memory_["solve"]["peak"] > 0
+    estimate = RegionKMeansHeuristic.estimate_memory(w.n, 3, 3)
+    assert estimate["peak"] == sum(v for key, v in estimate.items() if key != "peak")
+
+
+def test_grow():
+    numpy.random.seed(12345)
+    w = libpysal.weights.lat2W(10, 10)
+    data = numpy.random.normal(size=(w.n, 3))
+    adjacency = w_to_csr(w)
+    seeds = numpy.array([0, 55, 99])
+    label = _grow(data, seeds, adjacency)
+    numpy.testing.assert_array_equal(label[seeds], [0, 1, 2])
+    # every region is a single connected piece
+    assert label_components(adjacency, label).max() == 2
+    w = libpysal.weights.W({0: [1], 1: [0], 2: [3], 3: [2]})
+    with pytest.raises(ValueError):
+        _grow(numpy.zeros((4, 1)), numpy.array([0]), w_to_csr(w))
+
+
+def test_RegionKMeansHeuristic_moves():
+    w = libpysal.weights.lat2W(5, 5)
+    adjacency = w_to_csr(w)
+    for seed in [12359, 12360, 12363, 12364]:
+        numpy.random.seed(seed)
+        data = numpy.random.normal(size=(w.n, 3))
+        model = RegionKMeansHeuristic(data, 3, w, moves="independent")
+        model.solve()
+        # every region is a single connected piece
+        assert label_components(adjacency, model.labels_).max() == 2
+    model.moves = "sequential"
+    with pytest.raises(ValueError):
+        model.solve()
+
+
+def test_independent():
+    # a 1x6 strip, region 0 holds areas 0-3 and region 1 areas 4-5
+    w = libpysal.weights.lat2W(1, 6)
+    adjacency = w_to_csr(w)
+    label = numpy.array([0, 0, 0, 0, 1, 1])
+    regions = [{0, 1, 2, 3}, {4, 5}]
+    closest = numpy.array([1, 1, 1, 1, 1, 0])
+    # region 0 gives up two areas but not 1, which would split 0 from 2, and
+    # region 1 cannot give up area 5 to a source of the batch
+    batch, deferred = _independent([3, 1, 2, 5], label, closest, regions, adjacency)
+    assert batch == [3, 2]
+    assert deferred == [1, 5]
+
+
+def test_RegionKMeansHeuristic_empty_region():
+    w = libpysal.weights.lat2W(6, 6)
+    data = numpy.random.RandomState(4).random((w.n, 2))
+    numpy.random.seed(4)
+    model = RegionKMeansHeuristic(data, 14, w)
+    model.solve()
+    # region 3 empties and must not attract any area
+    expected = [
+        8, 8, 8, 8, 10, 10, 8, 0, 0, 0, 10, 10, 13, 13, 13, 0, 5, 2,
+        9, 11, 11, 7, 1, 1, 9, 12, 7, 7, 6, 6, 12, 12, 4, 4, 4, 6,
+    ]
+    numpy.testing.assert_array_equal(model.labels_, expected)
+    assert model.iters_ == 2
+    assert numpy.isnan(model.centroids_[3]).all()